@@ -0,0 +1,33 @@
+"""
+fake borg binary listing synthetic archives, use it with BORG_BIN
+"""
+
+import json
+import os
+import sys
+
+ARCHIVES = ("previous", "latest")
+
+
+def main():
+    count = int(os.getenv("FAKE_BORG_FILES", "1000"))
+    args = sys.argv[1:]
+    if args[:1] == ["list"] and "--json" in args:
+        archives = [
+            {"id": f"{i:064x}", "name": name, "time": f"2021-01-0{i + 1}T00:00:00"}
+            for i, name in enumerate(ARCHIVES)
+        ]
+        print(json.dumps({"archives": archives}))
+    elif args[:1] == ["list"] and "--json-lines" in args:
+        latest = args[1].endswith("::latest")
+        # the latest archive contains 10% more files and 1% modified files
+        for i in range(count if latest else count * 9 // 10):
+            size = 1000 + i + (1 if latest and i % 100 == 0 else 0)
+            path = f"photos/{i // 100}/IMG_{i}.jpg"
+            print(json.dumps({"path": path, "size": size, "type": "-"}))
+    else:
+        sys.exit(f"Unsupported command: {args}")
+
+
+if __name__ == "__main__":
+    main()
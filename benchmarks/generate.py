@@ -0,0 +1,128 @@
+"""
+generate reproducible synthetic photo libraries
+"""
+
+import random
+import shutil
+import struct
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from pathlib import Path
+
+START_DATE = datetime(2015, 1, 1)
+QUICKTIME_EPOCH = datetime(1904, 1, 1)
+
+
+def box(kind: bytes, *payload: bytes):
+    """
+    iso bmff box
+    """
+    data = b"".join(payload)
+    return struct.pack(">I4s", 8 + len(data), kind) + data
+
+
+def jpeg_bytes(date: datetime, subsec: str = None, payload: bytes = b""):
+    """
+    minimal jpeg with an exif segment containing the date
+    """
+    entries = [(0x9003, date.strftime("%Y:%m:%d %H:%M:%S").encode() + b"\0")]
+    if subsec:
+        entries.append((0x9291, subsec.encode().ljust(4, b"\0")[:4]))
+    exif_ifd = 8 + 2 + 12 + 4
+    values = exif_ifd + 2 + 12 * len(entries) + 4
+    tiff = b"MM\0\x2a" + struct.pack(">I", 8)
+    tiff += struct.pack(">HHHII", 1, 0x8769, 4, 1, exif_ifd) + b"\0" * 4
+    tiff += struct.pack(">H", len(entries))
+    blob = b""
+    for tag, value in entries:
+        if len(value) > 4:
+            tiff += struct.pack(">HHII", tag, 2, len(value), values + len(blob))
+            blob += value
+        else:
+            tiff += struct.pack(">HHI", tag, 2, len(value)) + value
+    app1 = b"Exif\0\0" + tiff + b"\0" * 4 + blob
+    out = b"\xff\xd8\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1
+    return out + b"\xff\xda" + payload + b"\xff\xd9"
+
+
+def mp4_bytes(date: datetime, payload: bytes = b""):
+    """
+    minimal mp4 with a mvhd atom containing the date
+    """
+    seconds = int((date - QUICKTIME_EPOCH).total_seconds())
+    mvhd = box(b"mvhd", struct.pack(">BxxxII", 0, seconds, seconds), b"\0" * 88)
+    ftyp = box(b"ftyp", b"isom", b"\0" * 4, b"isom", b"mp42")
+    return ftyp + box(b"mdat", payload) + box(b"moov", mvhd)
+
+
+def generate(
+    folder: Path,
+    count: int,
+    seed: int = 42,
+    depth: int = 3,
+    burst_ratio: float = 0.1,
+    duplicate_ratio: float = 0.05,
+    near_duplicate_ratio: float = 0.05,
+    video_ratio: float = 0.05,
+    payload_size: int = 2048,
+):
+    """
+    generate count files in folder, return the list of files
+    """
+    rng = random.Random(seed)
+    out = []
+    date = START_DATE
+    while len(out) < count:
+        date += timedelta(seconds=rng.randint(1, 3600))
+        parent = folder.joinpath(
+            *(f"{date:%Y}", f"{date:%m}", f"{date:%d}", "DCIM", "Camera")[:depth]
+        )
+        parent.mkdir(parents=True, exist_ok=True)
+        size = rng.randint(payload_size // 2, payload_size * 2)
+        payload = rng.getrandbits(size * 8).to_bytes(size, "little")
+        draw = rng.random()
+        if draw < video_ratio:
+            target = parent / f"VID_{len(out):08}.mp4"
+            target.write_bytes(mp4_bytes(date, payload))
+        elif draw < video_ratio + burst_ratio:
+            # several photos in the same second
+            for i in range(min(rng.randint(2, 5), count - len(out))):
+                target = parent / f"IMG_{len(out):08}_BURST{i}.jpg"
+                content = jpeg_bytes(date, f"{i * 100:03}", payload + bytes([i]))
+                target.write_bytes(content)
+                out.append(target)
+            continue
+        elif draw < video_ratio + burst_ratio + duplicate_ratio and out:
+            # exact copy of a previous file elsewhere
+            source = rng.choice(out)
+            target = parent / f"COPY_{len(out):08}{source.suffix}"
+            shutil.copyfile(source, target)
+        elif draw < video_ratio + burst_ratio + duplicate_ratio + near_duplicate_ratio:
+            # same date, recompressed content
+            target = parent / f"IMG_{len(out):08}.jpg"
+            target.write_bytes(jpeg_bytes(date, payload=payload))
+            out.append(target)
+            if len(out) == count:
+                break
+            target = parent / f"IMG_{len(out):08}_small.jpg"
+            target.write_bytes(jpeg_bytes(date, payload=payload[: size // 2]))
+        else:
+            target = parent / f"IMG_{len(out):08}.jpg"
+            target.write_bytes(jpeg_bytes(date, payload=payload))
+        out.append(target)
+    return out
+
+
+def main():
+    parser = ArgumentParser("generate")
+    parser.add_argument("-n", "--count", type=int, default=1000)
+    parser.add_argument("-s", "--seed", type=int, default=42)
+    parser.add_argument("-d", "--depth", type=int, default=3)
+    parser.add_argument("folder", type=Path)
+    args = parser.parse_args()
+    files = generate(args.folder, args.count, seed=args.seed, depth=args.depth)
+    print(f"Generated {len(files)} files in {args.folder}")
+
+
+if __name__ == "__main__":
+    main()
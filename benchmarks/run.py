@@ -0,0 +1,266 @@
+"""
+time photomatools operations on synthetic libraries, for example:
+
+    python -m benchmarks.run --scales 1000,10000 -o after.json
+    python -m benchmarks.run --compare before.json after.json
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+from photomatools.borg import BorgRepository
+from photomatools.cli import default_argument_paser
+from photomatools.cli.borg import FileFilter
+from photomatools.cli.dedup import Dedup
+from photomatools.cli.dispatch import Dispatch
+from photomatools.cli.pipeline import Pipeline
+from photomatools.cli.rename import Rename
+from photomatools.model import DATE_TAGS, MultimediaFile
+from photomatools.table import FileTable
+from photomatools.tools import preload
+from photomatools.utils import compute_fingerprint, visit
+
+from .generate import generate
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str, requires: str = None):
+    """
+    register a benchmark, optionally requiring an executable
+    """
+
+    def decorator(func):
+        BENCHMARKS[name] = (func, requires)
+        return func
+
+    return decorator
+
+
+def run_tool(tool_cls, *argv):
+    """
+    run a tool like the command line would do, without output
+    """
+    tool = tool_cls()
+    parser = default_argument_paser(tool.name)
+    tool.configure_parser(parser)
+    args = parser.parse_args(list(map(str, argv)))
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        tool.run(args)
+
+
+@benchmark("visit")
+def bench_visit(root: Path, files: list, workdir: Path):
+    for _ in visit([root], recursive=True):
+        pass
+
+
+@benchmark("preload")
+def bench_preload(root: Path, files: list, workdir: Path):
+    for _ in preload(
+        MultimediaFile.filter_map(files, tags=DATE_TAGS),
+        lambda x: x.create_date,
+        verbose=False,
+    ):
+        pass
+
+
+@benchmark("compute_fingerprint")
+def bench_fingerprint(root: Path, files: list, workdir: Path):
+    for file in files:
+        compute_fingerprint(file, hashlib.md5)
+
+
+@benchmark("table-group")
+def bench_table_group(root: Path, files: list, workdir: Path):
+    table = FileTable()
+    for file in files:
+        table.append(file)
+    for _ in table.group_indices("size", "mtime"):
+        pass
+
+
+@benchmark("dedup-md5")
+def bench_dedup_md5(root: Path, files: list, workdir: Path):
+    run_tool(Dedup, "-s", "md5", root)
+
+
+@benchmark("dedup-exif", requires="exiftool")
+def bench_dedup_exif(root: Path, files: list, workdir: Path):
+    run_tool(Dedup, "-s", "exif", root)
+
+
+@benchmark("rename")
+def bench_rename(root: Path, files: list, workdir: Path):
+    run_tool(Rename, "--dryrun", "-o", workdir / "renamed", root)
+
+
+@benchmark("dispatch")
+def bench_dispatch(root: Path, files: list, workdir: Path):
+    output = workdir / "dispatched"
+    for prefix in ("IMG_", "VID_", "COPY_"):
+        (output / prefix).mkdir(parents=True, exist_ok=True)
+    run_tool(Dispatch, "--dryrun", "-o", output, root)
+
+
+@benchmark("pipeline")
+def bench_pipeline(root: Path, files: list, workdir: Path):
+    run_tool(Pipeline, "--dryrun", "-o", workdir / "library", root)
+
+
+@benchmark("borg-filefilter")
+def bench_borg(root: Path, files: list, workdir: Path):
+    borg_bin, fake_borg = workdir / "borg", Path(__file__).parent / "fake_borg.py"
+    borg_bin.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{fake_borg}" "$@"\n')
+    borg_bin.chmod(0o755)
+    env = {"BORG_BIN": str(borg_bin), "FAKE_BORG_FILES": str(len(files))}
+    with mock.patch.dict(os.environ, env):
+        repo = BorgRepository(workdir / "repo")
+        previous, latest = repo.archives
+        tuple(filter(FileFilter(previous, None).accept, latest.files))
+
+
+# modules only needed once a command processes files
+STARTUP_LAZY_MODULES = (
+    "photomatools.daemon",
+    "photomatools.index",
+    "photomatools.plan",
+)
+
+
+@benchmark("startup")
+def bench_startup(root: Path, files: list, workdir: Path):
+    # import time of the pmt entry point, like a shell loop calling it, the
+    # benchmark fails if a lazy module is imported at startup again
+    script = (
+        "import sys\n"
+        "from photomatools.cli.allinone import main\n"
+        "try:\n"
+        "    main()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"loaded = sorted(sys.modules.keys() & {set(STARTUP_LAZY_MODULES)!r})\n"
+        "assert not loaded, f'imported at startup: {loaded}'\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", script, "dispatch", "--help"],
+        env={**os.environ, "PMT_NO_DAEMON": "1"},
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scales: list, names: list, repeat: int, seed: int):
+    """
+    run benchmarks, keep the best time of each
+    """
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory(prefix="pmt-bench-") as tmp:
+            root, workdir = Path(tmp) / "library", Path(tmp) / "work"
+            workdir.mkdir()
+            files = generate(root, scale, seed=seed)
+            for name in names:
+                func, requires = BENCHMARKS[name]
+                if requires is not None and shutil.which(requires) is None:
+                    print(f"Skip {name}: cannot find {requires}", file=sys.stderr)
+                    continue
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    func(root, files, workdir)
+                    timings.append(time.perf_counter() - start)
+                results.append({"name": name, "scale": scale, "seconds": min(timings)})
+                print(f"{name:>20} {scale:>8} {min(timings):10.3f}s", file=sys.stderr)
+    return {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(before: Path, after: Path):
+    """
+    print the speedup between two result files
+    """
+    before, after = (
+        {
+            (r["name"], r["scale"]): r["seconds"]
+            for r in json.loads(f.read_text())["results"]
+        }
+        for f in (before, after)
+    )
+    print(f"{'benchmark':>20} {'scale':>8} {'before':>10} {'after':>10} {'speedup':>8}")
+    for key in sorted(before.keys() & after.keys()):
+        print(
+            f"{key[0]:>20} {key[1]:>8} {before[key]:9.3f}s {after[key]:9.3f}s",
+            f"{before[key] / after[key]:7.2f}x" if after[key] else "",
+        )
+
+
+def main():
+    parser = ArgumentParser("benchmarks")
+    parser.add_argument(
+        "--scales",
+        type=lambda x: [int(i) for i in x.split(",")],
+        default=[100, 1000],
+        help="comma separated numbers of files, default: 100,1000",
+    )
+    parser.add_argument(
+        "-b",
+        "--benchmark",
+        dest="names",
+        action="append",
+        choices=sorted(BENCHMARKS),
+        help="benchmarks to run, default: all",
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-s", "--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", type=Path, help="write json results")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        type=Path,
+        metavar=("BEFORE", "AFTER"),
+        help="compare two json results",
+    )
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    out = run(args.scales, args.names or list(BENCHMARKS), args.repeat, args.seed)
+    if args.output:
+        args.output.write_text(json.dumps(out, indent=2))
+    else:
+        print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
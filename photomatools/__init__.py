@@ -1,6 +1,10 @@
-try:
-    import importlib.metadata as importlib_metadata
-except ModuleNotFoundError:
-    import importlib_metadata
+def __getattr__(name: str):
+    # importlib.metadata is slow to import, only load it when needed
+    if name == "__version__":
+        try:
+            import importlib.metadata as importlib_metadata
+        except ModuleNotFoundError:
+            import importlib_metadata
 
-__version__ = importlib_metadata.version(__name__)
\ No newline at end of file
+        return importlib_metadata.version(__name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
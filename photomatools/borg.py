@@ -1,13 +1,21 @@
+import hashlib
 import subprocess
+import tempfile
+from concurrent.futures.thread import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
 from functools import total_ordering
-from json import loads
+from json import dumps, loads
 from os import getenv
 from pathlib import Path
+from threading import Lock
+from typing import Iterable
 
 from cached_property import cached_property
 
+CHUNK_SIZE = 1024 * 1024
+
 
 def borg_cmd_to_json(*cmd, multiple: bool = False):
     """
@@ -27,6 +35,20 @@ def borg_cmd_to_json(*cmd, multiple: bool = False):
     )
 
 
+@contextmanager
+def patterns_file(paths: Iterable[str]):
+    """
+    write a borg patterns file selecting only the given paths,
+    to avoid command line length limits
+    """
+    with tempfile.NamedTemporaryFile("w", prefix="pmt-", suffix=".patterns") as fp:
+        for path in paths:
+            fp.write(f"+ pp:{path}\n")
+        fp.write("- fm:*\n")
+        fp.flush()
+        yield fp.name
+
+
 @dataclass
 class BorgRepository:
     folder: Path
@@ -93,6 +115,34 @@ class BorgArchive:
     def borg_name(self):
         return f"{self.repo.borg_name}::{self.name}"
 
+    def iter_fingerprints(self, files: Iterable, func: callable = hashlib.md5):
+        """
+        stream the content of the files with a single borg extract --stdout
+        and compute their fingerprint without writing anything on disk
+        """
+        # borg extracts files in archive order, use it to split the stream
+        order = {f.path: i for i, f in enumerate(self.files)}
+        files = sorted(files, key=lambda f: order[f.path])
+        if len(files) == 0:
+            return
+        with patterns_file(f.path for f in files) as patterns:
+            command = [getenv("BORG_BIN", "borg"), "extract", "--stdout"]
+            command += ["--patterns-from", patterns, self.borg_name]
+            with subprocess.Popen(
+                command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE
+            ) as process:
+                for bfile in files:
+                    algo, remaining = func(), bfile.size
+                    while remaining > 0:
+                        chunk = process.stdout.read(min(remaining, CHUNK_SIZE))
+                        if not chunk:
+                            raise IOError(f"Unexpected end of {bfile.path}")
+                        algo.update(chunk)
+                        remaining -= len(chunk)
+                    yield bfile, algo.hexdigest()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command)
+
     def __str__(self):
         return f"{self.repo.folder}::{self.name} ({self.date})"
 
@@ -127,3 +177,71 @@ class BorgFile:
         if not isinstance(other, BorgFile):
             return NotImplemented
         return self.path == other.path and self.size == other.size
+
+
+@dataclass
+class BorgExtraction:
+    archive: BorgArchive
+    folder: Path
+    chunk_size: int = 1000
+    workers: int = 1
+
+    @cached_property
+    def journal(self):
+        return self.folder / f".borg-extract-{self.archive.uid[:16]}.journal"
+
+    @cached_property
+    def lock(self):
+        return Lock()
+
+    def extracted_paths(self):
+        """
+        paths already extracted by a previous run
+        """
+        if not self.journal.exists():
+            return set()
+        with self.journal.open() as fp:
+            return {loads(line) for line in fp if line.strip()}
+
+    def chunks(self, files: Iterable[BorgFile]):
+        """
+        split the files not extracted yet in chunks
+        """
+        done = self.extracted_paths()
+        files = [f for f in files if f.path not in done]
+        return [
+            files[i : i + self.chunk_size]
+            for i in range(0, len(files), self.chunk_size)
+        ]
+
+    def extract_chunk(self, chunk: list):
+        """
+        extract a chunk of files and record them in the journal
+        """
+        with patterns_file(f.path for f in chunk) as patterns:
+            subprocess.run(
+                [
+                    getenv("BORG_BIN", "borg"),
+                    "extract",
+                    "--patterns-from",
+                    patterns,
+                    self.archive.borg_name,
+                ],
+                stdin=subprocess.DEVNULL,
+                cwd=self.folder,
+                check=True,
+            )
+        with self.lock, self.journal.open("a") as fp:
+            for bfile in chunk:
+                fp.write(dumps(bfile.path) + "\n")
+        return chunk
+
+    def run(self, chunks: list):
+        """
+        extract all chunks, yield them when done, the journal is removed once
+        the extraction is complete
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            yield from executor.map(self.extract_chunk, chunks)
+        if self.journal.exists():
+            self.journal.unlink()
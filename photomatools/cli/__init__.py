@@ -4,12 +4,11 @@ package cli
 
 import sys
 from abc import ABC, abstractmethod
-from argparse import ArgumentParser, Namespace
-from dataclasses import dataclass
+from contextlib import contextmanager
+from argparse import SUPPRESS, Action, ArgumentParser, ArgumentTypeError, Namespace
+from pathlib import Path
 
-from colorama import init
-
-from .. import __version__
+from colorama import Fore, Style, init
 
 init()
 
@@ -56,12 +55,42 @@ class Tool(ABC):
         """
 
 
+class VersionAction(Action):
+    """
+    like the version action but only read the version when needed
+    """
+
+    def __init__(self, option_strings, dest=SUPPRESS, default=SUPPRESS, help=None):
+        super().__init__(option_strings, dest, default=default, nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        from .. import __version__  # pylint: disable=import-outside-toplevel
+
+        parser.exit(message=f"version {__version__}\n")
+
+
+def device_jobs(value: str):
+    """
+    parse a pool size N or PATH=N
+    """
+    path, _, count = value.rpartition("=")
+    try:
+        count = int(count)
+    except ValueError:
+        raise ArgumentTypeError(f"invalid device jobs: {value}") from None
+    if count < 1:
+        raise ArgumentTypeError(f"invalid device jobs: {value}")
+    return (Path(path) if path else None), count
+
+
 def default_argument_paser(name: str, description: str = None):
     """
     create a new parser with common options
     """
     parser = ArgumentParser(name, description=description)
-    parser.add_argument("--version", action="version", version=f"version {__version__}")
+    parser.add_argument(
+        "--version", action=VersionAction, help="show program's version and exit"
+    )
     parser.add_argument(
         "-n",
         "--dryrun",
@@ -84,4 +113,164 @@ def default_argument_paser(name: str, description: str = None):
     parser.add_argument(
         "-j", "--jobs", type=int, default=4, help="number of parallel threads"
     )
+    parser.add_argument(
+        "--io-order",
+        choices=("walk", "inode", "physical"),
+        default="walk",
+        help="order of file reads, inode or physical (FIEMAP) order reduces seeks on rotating disks, default: walk",
+    )
+    parser.add_argument(
+        "--readers-per-device",
+        type=int,
+        metavar="N",
+        help="maximum number of files read at the same time on a device",
+    )
+    parser.add_argument(
+        "--readahead",
+        type=int,
+        default=0,
+        metavar="N",
+        help="ask the kernel to prefetch the next N files",
+    )
+    parser.add_argument(
+        "--io-limit",
+        type=float,
+        metavar="MB/s",
+        help="maximum read throughput of all threads, in MiB per second",
+    )
+    parser.add_argument(
+        "--device-jobs",
+        type=device_jobs,
+        action="append",
+        metavar="[PATH=]N",
+        help="use a pool of N threads per device instead of --jobs threads for all files, PATH=N sets the pool size of the device of PATH",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print time spent per stage and counters at exit",
+    )
+    parser.add_argument(
+        "--profile-dump",
+        metavar="FILE",
+        type=Path,
+        help="write a cProfile dump of the main thread",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        type=Path,
+        help="write a chrome trace event timeline of all threads",
+    )
     return parser
+
+
+def preload_kwargs(args: Namespace):
+    """
+    workers and io scheduler given by the common options
+    """
+    from ..utils import IOScheduler  # pylint: disable=import-outside-toplevel
+
+    device_workers = None
+    if args.device_jobs:
+        # devices are identified by st_dev
+        device_workers = {
+            path and path.stat().st_dev: count for path, count in args.device_jobs
+        }
+    return {
+        "workers": args.jobs,
+        "scheduler": IOScheduler(
+            args.io_order,
+            args.readers_per_device,
+            args.readahead,
+            device_workers,
+            args.io_limit and args.io_limit * 1024 * 1024,
+        ),
+    }
+
+
+def add_plan_arguments(parser: ArgumentParser):
+    """
+    options to save the operations of a tool and execute them later
+    """
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--plan-out",
+        metavar="FILE",
+        type=Path,
+        help="save the operations to a plan file instead of executing them",
+    )
+    group.add_argument(
+        "--plan-in",
+        metavar="FILE",
+        type=Path,
+        help="execute the operations of a plan file if their sources did not change",
+    )
+    group.add_argument(
+        "--rollback",
+        action="store_true",
+        help="undo the operations recorded in the journal",
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="FILE",
+        type=Path,
+        help="record executed operations to resume an interrupted run or rollback it",
+    )
+
+
+@contextmanager
+def plan_runner(args: Namespace):
+    """
+    runner executing the operations of a tool, or saving them with --plan-out
+    """
+    from ..plan import Runner  # pylint: disable=import-outside-toplevel
+
+    with Runner(
+        args.journal, plan=args.plan_out is not None, dryrun=args.dryrun
+    ) as out:
+        yield out
+    if args.plan_out is not None:
+        out.plan.save(args.plan_out)
+        print(f"Save {len(out.plan)} operation(s) to {args.plan_out}")
+
+
+def run_plan(args: Namespace):
+    """
+    execute the plan file or rollback the journal, return the exit code
+    """
+    # pylint: disable=import-outside-toplevel
+    from ..plan import Journal, Plan
+    from ..tools import label
+
+    if args.rollback and args.journal is None:
+        raise ValueError("--rollback needs --journal")
+    if args.rollback and not args.journal.exists():
+        raise ValueError(f"Cannot find journal {args.journal}")
+    out = 0
+    with Journal(args.journal) as journal:
+        if args.rollback:
+            operations = list(journal.done())
+        else:
+            operations = Plan.load(args.plan_in)
+        for operation in operations:
+            verb = "undo" if args.rollback else operation.action
+            message = f"{verb} '{label(operation.source)}' -> '{label(operation.dest)}'"
+            try:
+                if args.dryrun:
+                    if not args.rollback:
+                        operation.check()
+                    print(f"{message} {Fore.CYAN}(dryrun){Style.RESET_ALL}")
+                elif args.rollback:
+                    journal.undo(operation)
+                    print(message)
+                elif journal.execute(operation):
+                    print(message)
+                else:
+                    print(f"Skip {message}: already done")
+            except (OSError, ValueError) as e:  # pylint: disable=invalid-name
+                print(
+                    f"{Fore.RED}Cannot {verb} {operation.source}: {Style.BRIGHT}{e}{Style.RESET_ALL}"
+                )
+                out = 1
+    return out
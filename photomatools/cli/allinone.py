@@ -1,38 +1,122 @@
 import sys
+from importlib import import_module
+from os import getenv, getuid
+from pathlib import Path
 from traceback import print_stack
 
 from colorama import Fore, Style
 
+from ..profiling import PROFILER
 from . import Tool, default_argument_paser
-from .borg import Borg
-from .dedup import Dedup
-from .dispatch import Dispatch
-from .rename import Rename
-from .uniq import Uniq
-from .view import View, Diff
+
+# tools are only imported when selected to keep startup fast
+TOOLS = {
+    "rename": (".rename", "Rename", "rename files with the creation date"),
+    "uniq": (".uniq", "Uniq", "rename files with their fingerprint"),
+    "view": (".view", "View", "view metadata"),
+    "diff": (".view", "Diff", "compare metadata"),
+    "dispatch": (
+        ".dispatch",
+        "Dispatch",
+        "auto move/link/copy files in folder named with a prefix of the file",
+    ),
+    "pipeline": (
+        ".pipeline",
+        "Pipeline",
+        "rename files, skip duplicates and dispatch them in year folders",
+    ),
+    "borg": (".borg", "Borg", "find new files in a borg archive"),
+    "dedup": (".dedup", "Dedup", "find duplicates files"),
+    "index": (
+        ".index",
+        "Index",
+        "build or update the fingerprint index of a library",
+    ),
+    "verify": (
+        ".verify",
+        "Verify",
+        "hash files again to detect silent corruption",
+    ),
+    "daemon": (
+        ".daemon",
+        "Daemon",
+        "run pmt in background to keep exiftool and caches warm",
+    ),
+}
+
+
+def load_tool(name: str) -> Tool:
+    """
+    import the tool module and instanciate the tool
+    """
+    module, cls, _ = TOOLS[name]
+    return getattr(import_module(module, __package__), cls)()
+
+
+def daemon_socket():
+    """
+    socket used by the daemon and the client
+    """
+    # defined here to check for a daemon without importing the client
+    if getenv("PMT_SOCKET"):
+        return Path(getenv("PMT_SOCKET"))
+    if getenv("XDG_RUNTIME_DIR"):
+        return Path(getenv("XDG_RUNTIME_DIR")) / "photomatools.sock"
+    # private folder in the shared temporary directory, tempfile is slow to
+    # import and would also look for a writable folder
+    folder = Path(getenv("TMPDIR") or "/tmp") / f"photomatools-{getuid()}"
+    return folder / "daemon.sock"
 
 
 def main():
     """
     all-in-one entry point
     """
+    argv = sys.argv[1:]
+    selected = next(filter(TOOLS.__contains__, argv), None)
+    path = daemon_socket()
+    if (
+        selected not in (None, "daemon")
+        and not getenv("PMT_NO_DAEMON")
+        and path.exists()
+    ):
+        # pylint: disable=import-outside-toplevel
+        from ..daemon import forward
+
+        ret = forward(argv, path)
+        if ret is not None:
+            sys.exit(ret)
+    sys.exit(run(argv))
+
+
+def run(argv: list):
+    """
+    run a command, return the exit code
+    """
     parser = default_argument_paser("pmt")
     parser.set_defaults(handler=None)
 
+    # the first argument matching a tool name is the sub-command
+    selected = next(filter(TOOLS.__contains__, argv), None)
     subparsers = parser.add_subparsers(help="sub-command help")
-    for tool_cls in (Rename, Uniq, View, Diff, Dispatch, Borg, Dedup):
-        tool = tool_cls()
-        subparser = subparsers.add_parser(tool.name, help=tool.description)
-        subparser.set_defaults(handler=tool)
-        tool.configure_parser(subparser)
+    for name, (_, _, description) in TOOLS.items():
+        subparser = subparsers.add_parser(name, help=description)
+        if name == selected:
+            tool = load_tool(name)
+            subparser.set_defaults(handler=tool)
+            tool.configure_parser(subparser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     if not isinstance(args.handler, Tool):
         parser.print_help()
-        sys.exit(2)
+        return 2
+    if args.profile or args.profile_dump or args.trace:
+        PROFILER.enable(
+            trace=args.trace is not None, profile=args.profile_dump is not None
+        )
     try:
         ret = args.handler.run(args)
-        sys.exit(ret if isinstance(ret, int) else 0)
+        return ret if isinstance(ret, int) else 0
     except SystemExit:
         raise
     except BaseException as e:  # pylint: disable=broad-except,invalid-name
@@ -40,4 +124,6 @@ def main():
         if args.verbose:
             print_stack(e)
         print(Style.RESET_ALL, end="")
-        sys.exit(1)
+        return 1
+    finally:
+        PROFILER.stop(summary=args.profile, trace=args.trace, profile=args.profile_dump)
@@ -1,13 +1,16 @@
 import re
 import subprocess
+import time
 from argparse import ArgumentParser, Namespace
 from dataclasses import dataclass
-from os import getenv
+from datetime import timedelta
 from pathlib import Path
 
-from ..borg import BorgArchive, BorgFile, BorgRepository
+from ..borg import BorgArchive, BorgExtraction, BorgFile, BorgRepository
+from ..index import FingerprintIndex, default_index_file
 from ..utils import sizeof_fmt
-from . import Tool
+from . import Tool, preload_kwargs
+from .index import report_error
 
 
 class Borg(Tool):
@@ -59,6 +62,37 @@ class Borg(Tool):
             type=Path,
             help="extract new files to this folder",
         )
+        parser.add_argument(
+            "-k",
+            "--skip-known",
+            metavar="FOLDER",
+            type=Path,
+            action="append",
+            help="do not extract files whose content already exists in this folder",
+        )
+        parser.add_argument(
+            "--index",
+            metavar="FILE",
+            type=Path,
+            default=default_index_file(),
+            help=f"fingerprint index used by --skip-known, default: {default_index_file()}",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            metavar="N",
+            type=int,
+            default=1000,
+            help="extract files by chunks of N files, default: 1000",
+        )
+        parser.add_argument(
+            "-P",
+            "--parallel",
+            dest="workers",
+            metavar="N",
+            type=int,
+            default=1,
+            help="number of parallel borg extract processes, default: 1",
+        )
         parser.add_argument("repo", type=Path)
 
     def run(self, args: Namespace):
@@ -97,16 +131,65 @@ class Borg(Tool):
                 if not args.output_dir.is_dir():
                     raise ValueError(f"Invalid folder {args.output_dir}")
 
+                if args.skip_known:
+                    newfiles = self.filter_known(archive, newfiles, args)
+                if len(newfiles) == 0:
+                    print("No file to extract")
+                    return
+
+                extraction = BorgExtraction(
+                    archive,
+                    args.output_dir,
+                    chunk_size=args.chunk_size,
+                    workers=args.workers,
+                )
+                chunks = extraction.chunks(newfiles)
+                remaining = sum(len(c) for c in chunks)
+                if remaining < len(newfiles):
+                    print(
+                        f"Resume extraction, {len(newfiles) - remaining} file(s) already extracted"
+                    )
                 print(
-                    f"Extract {len(newfiles)} new file{'s' if len(newfiles)>1 else ''} to {args.output_dir}"
+                    f"Extract {remaining} new file{'s' if remaining>1 else ''} to {args.output_dir}"
                 )
+                self.extract(extraction, chunks)
 
-                subprocess.run(
-                    [getenv("BORG_BIN", "borg"), "extract", "--list", archive.borg_name]
-                    + [f.path for f in newfiles],
-                    cwd=args.output_dir,
-                    check=True,
-                )
+    def extract(self, extraction: BorgExtraction, chunks: list):
+        """
+        extract chunks and display progress
+        """
+        total_size = sum(f.size for c in chunks for f in c)
+        done_size, start = 0, time.monotonic()
+        for i, chunk in enumerate(extraction.run(chunks), start=1):
+            done_size += sum(f.size for f in chunk)
+            elapsed = time.monotonic() - start
+            speed = done_size / elapsed if elapsed > 0 else 0
+            eta = (total_size - done_size) / speed if speed > 0 else 0
+            print(
+                f"  [{i}/{len(chunks)}] {sizeof_fmt(done_size)}/{sizeof_fmt(total_size)}",
+                f"{sizeof_fmt(speed)}/s, ETA {timedelta(seconds=int(eta))}",
+                sep=", ",
+            )
+
+    def filter_known(self, archive: BorgArchive, newfiles: tuple, args: Namespace):
+        """
+        remove files whose content is already in the local library
+        """
+        with FingerprintIndex(args.index) as index:
+            print(f"Update index {args.index}")
+            index.scan(args.skip_known, on_error=report_error, **preload_kwargs(args))
+            # files with a size not in the library cannot be known
+            candidates = [
+                f for f in newfiles if index.find(f.size, roots=args.skip_known)
+            ]
+            print(f"Check content of {len(candidates)} file(s) with known size")
+            known = set()
+            for bfile, fingerprint in archive.iter_fingerprints(candidates, index.func):
+                same = index.find(bfile.size, fingerprint, roots=args.skip_known)
+                if len(same) > 0:
+                    print(f"    Skip {bfile.path}: same content as {same[0]}")
+                    known.add(bfile.path)
+        return tuple(f for f in newfiles if f.path not in known)
 
 
 @dataclass
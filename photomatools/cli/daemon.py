@@ -0,0 +1,60 @@
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+
+from .. import utils
+from ..daemon import DaemonServer, default_socket, stop
+from ..utils import ExifToolPool, FileCache
+from . import Tool
+
+
+class Daemon(Tool):
+    """
+    run pmt in background to keep exiftool and caches warm
+    """
+
+    def configure_parser(self, parser: ArgumentParser):
+        """
+        configure the argument parser
+        """
+        parser.add_argument(
+            "--socket",
+            metavar="PATH",
+            type=Path,
+            default=default_socket(),
+            help=f"unix socket, default: {default_socket()}",
+        )
+        parser.add_argument(
+            "--stop", action="store_true", help="stop the running daemon"
+        )
+        parser.add_argument(
+            "--cache-size",
+            metavar="N",
+            type=int,
+            default=200000,
+            help="maximum number of cached metadata and fingerprints",
+        )
+
+    def run(self, args: Namespace):
+        """
+        process
+        """
+        if args.stop:
+            stop(args.socket)
+            return 0
+        # pylint: disable=import-outside-toplevel
+        from .allinone import run
+
+        utils.RESIDENT = True
+        utils.FILE_CACHE = FileCache(args.cache_size)
+        utils.EXIFTOOL_POOL = ExifToolPool(args.jobs)
+        server = DaemonServer(args.socket, run)
+        print(f"Listening on {args.socket}")
+        try:
+            server.serve()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            utils.EXIFTOOL_POOL.close()
+            utils.EXIFTOOL_POOL = utils.FILE_CACHE = None
+            utils.RESIDENT = False
+        return 0
@@ -1,15 +1,51 @@
 import argparse
+import hashlib
 from argparse import ArgumentParser, Namespace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.thread import ThreadPoolExecutor
+from functools import partial
 from operator import itemgetter
 from pathlib import Path
-from typing import Set
+from typing import Iterable, List, Set
 
-from photomatools.utils import sizeof_fmt
+from colorama import Fore, Style
 
-from ..model import MultimediaFile
-from ..tools import label, preload
-from ..utils import iter_to_map, visit
-from . import Tool
+from ..index import FingerprintIndex, default_index_file, iter_index
+from ..model import DATE_TAGS, MultimediaFile
+from ..profiling import PROFILER
+from ..table import MISSING, FileTable, hash_prefix, timestamp
+from ..tools import PRELOAD_BATCH_SIZE, Progress, label, preload
+from ..utils import (
+    PARTIAL_SIZE,
+    TreeHash,
+    compute_fingerprint,
+    fingerprint_name,
+    iter_to_groups_on_disk,
+    iter_to_map,
+    peak_memory,
+    sizeof_fmt,
+    visit,
+)
+from . import Tool, preload_kwargs
+from .index import report_error
+
+# strategies comparing the fingerprint of files with the same size
+FINGERPRINTS = {"md5": hashlib.md5, "b2tree": TreeHash}
+# strategies using a perceptual hash, numpy and Pillow are only imported if used
+PERCEPTUAL_HASHES = ("phash", "dhash")
+
+
+def shard(value: str):
+    """
+    parse a shard I/N
+    """
+    try:
+        index, count = map(int, value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard: {value}") from None
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"invalid shard: {value}")
+    return index, count
 
 
 class Dedup(Tool):
@@ -17,6 +53,10 @@ class Dedup(Tool):
     find duplicates files
     """
 
+    # metadata needed by each strategy to group files, the comparison
+    # of potential duplicates reads all metadata, see Rename.METADATA
+    METADATA = {"md5": {}, "b2tree": {}, "exif": {"tags": DATE_TAGS, "fast": 1}}
+
     def configure_parser(self, parser: ArgumentParser):
         """
         configure the argument parser
@@ -24,49 +64,330 @@ class Dedup(Tool):
         parser.add_argument(
             "-s",
             "--strategy",
-            choices=("md5", "exif"),
+            choices=(*FINGERPRINTS, "exif", *PERCEPTUAL_HASHES),
             default="md5",
-            help="strategy to find duplicates, default: md5",
+            help="strategy to find duplicates, b2tree hashes big files faster with multiple cores, default: md5",
+        )
+        parser.add_argument(
+            "--distance",
+            type=int,
+            default=10,
+            metavar="N",
+            help="maximum hamming distance between similar images with phash/dhash, default: 10",
+        )
+        parser.add_argument(
+            "--index",
+            type=Path,
+            metavar="FILE",
+            default=default_index_file(),
+            help=f"index used to cache perceptual hashes, default: {default_index_file()}",
+        )
+        parser.add_argument(
+            "--out-of-core",
+            action="store_true",
+            help="group files on disk to bound memory usage",
+        )
+        parser.add_argument(
+            "--temp-dir",
+            type=Path,
+            metavar="DIR",
+            help="folder used to group files on disk, default: temporary folder",
+        )
+        parser.add_argument(
+            "--shard",
+            type=shard,
+            metavar="I/N",
+            help="only index the shard I (from 0 to N-1) of the files in --index-out",
+        )
+        parser.add_argument(
+            "--index-out",
+            type=Path,
+            metavar="FILE",
+            help="write the fingerprints to an index file instead of reporting duplicates",
+        )
+        parser.add_argument(
+            "--against",
+            type=Path,
+            metavar="INDEX",
+            help="report files already in a library index, see pmt index",
+        )
+        parser.add_argument(
+            "--merge",
+            action="store_true",
+            help="report duplicates found in the given index files",
         )
         parser.add_argument(
             "files",
             nargs=argparse.ONE_OR_MORE,
             type=Path,
-            help="files/folders to check",
+            help="files/folders to check, or index files with --merge",
         )
 
     def run(self, args: Namespace):
         """
         process
         """
-        # keep files in a dict by size
-        def get_data(file: MultimediaFile):
-            if args.strategy == "md5":
-                return file.size
-            if args.strategy == "exif":
-                return file.get_event_label()
+        if (
+            args.shard or args.index_out or args.merge or args.against
+        ) and args.strategy != "md5":
+            raise ValueError("Index files only support the md5 strategy")
+        if args.shard and not args.index_out:
+            raise ValueError("--shard needs --index-out")
+        if args.index_out:
+            with FingerprintIndex(args.index_out) as index:
+                changed, removed, errors = index.scan(
+                    args.files,
+                    shard=args.shard,
+                    on_error=report_error,
+                    **preload_kwargs(args),
+                )
+            print(
+                f"Index {label(args.index_out)}: {changed} updated, {removed} removed, {errors} unreadable"
+            )
+            return 1 if errors else 0
+        if args.merge:
+            self._merge(args)
+            return
+        if args.against:
+            self._check_against(args)
+            return
+
+        if args.strategy in PERCEPTUAL_HASHES:
+            self._find_similar(args)
+            return
+
+        if args.out_of_core:
+            groups = self._iter_groups_on_disk(args)
+        else:
+            groups = self._iter_groups(args)
+
+        for paths in groups:
+            # if multiple files are in the same group
+            if len(paths) > 1:
+                files = set(map(MultimediaFile, paths))
+                if args.strategy in FINGERPRINTS:
+                    self._find_dupplicates_fingerprint(
+                        files, FINGERPRINTS[args.strategy]
+                    )
+                elif args.strategy == "exif":
+                    with PROFILER.stage("sort"):
+                        files = sorted(files)
+                    self._find_dupplicates_exif(files)
+        if args.verbose:
+            memory = peak_memory()
+            if memory is not None:
+                print(f"Peak memory: {sizeof_fmt(memory)}")
+
+    def _iter_groups(self, args: Namespace):
+        """
+        group files in memory with a FileTable, yield the paths of each group
+        """
+        table = FileTable.scan(visit(args.files, recursive=True))
+        progress = Progress(enabled=not args.quiet)
+
+        def partial_hash(row: int):
+            try:
+                return hash_prefix(
+                    compute_fingerprint(
+                        table.paths[row], hashlib.md5, limit=PARTIAL_SIZE
+                    )
+                )
+            except OSError:
+                return MISSING
+
+        def load_date(row: int):
+            try:
+                date = MultimediaFile(
+                    table.paths[row], **self.METADATA["exif"]
+                ).create_date
+                return MISSING if date is None else timestamp(date)
+            except BaseException:  # pylint: disable=broad-except
+                return MISSING
+
+        if args.strategy in FINGERPRINTS:
+            # files with the same size, then the same partial hash
+            rows = [row for group in table.group_indices("size") for row in group]
+            column, names, func = "hash", ("size", "hash"), partial_hash
+        elif args.strategy == "exif":
+            rows = range(len(table))
+            column, names, func = "date", ("date",), load_date
+        else:
             raise ValueError()
 
-        known_files = iter_to_map(
-            preload(
-                MultimediaFile.filter_map(visit(args.files, recursive=True)),
+        progress.total = len(rows)
+        scheduler = preload_kwargs(args)["scheduler"]
+        ordered = scheduler.sort(rows, table.paths.__getitem__)
+        task = scheduler.task(ordered, func, table.paths.__getitem__)
+        try:
+            with scheduler.executor(args.jobs) as submit:
+                jobs = {
+                    submit(table.paths[row], task, i): row
+                    for i, row in enumerate(ordered)
+                }
+                for job in as_completed(jobs):
+                    row = jobs[job]
+                    table.columns[column][row] = job.result()
+                    progress.update(table.paths[row].name, table.columns["size"][row])
+        finally:
+            progress.close()
+
+        for group in table.group_indices(*names, rows=rows):
+            if table.columns[column][group[0]] != MISSING:
+                yield [table.paths[row] for row in group]
+
+    def _iter_groups_on_disk(self, args: Namespace):
+        """
+        group files on disk, yield the paths of each group
+        """
+        # only keep compact keys, files are loaded again for candidate groups
+        def get_data(file: MultimediaFile):
+            try:
+                if args.strategy in FINGERPRINTS:
+                    return file.size, str(file.file)
+                if args.strategy == "exif":
+                    return file.get_event_label(), str(file.file)
+                raise ValueError()
+            finally:
+                file.release()
+
+        results = (
+            result
+            for _, result in preload(
+                MultimediaFile.filter_map(
+                    visit(args.files, recursive=True), **self.METADATA[args.strategy]
+                ),
                 get_data,
-                workers=args.jobs,
-            ),
-            itemgetter(1),
-            value_fnc=itemgetter(0),
+                **preload_kwargs(args),
+                batch_size=PRELOAD_BATCH_SIZE,
+            )
+            if result is not None
         )
-        for files in known_files.values():
-            files = set(files)
-            # if multiple files have the same size
-            if len(files) > 1:
-                if args.strategy == "md5":
-                    self._find_dupplicates_md5(set(files))
-                elif args.strategy == "exif":
-                    self._find_dupplicates_exif(set(files))
+        groups = iter_to_groups_on_disk(
+            results, itemgetter(0), itemgetter(1), folder=args.temp_dir
+        )
+        if args.strategy in FINGERPRINTS:
+            # split groups of files with the same size on disk again
+            groups = iter_to_groups_on_disk(
+                self._iter_partial_hashes(groups, args.jobs),
+                itemgetter(0),
+                itemgetter(1),
+                folder=args.temp_dir,
+            )
+        for _, paths in groups:
+            yield paths
+
+    def _iter_partial_hashes(self, groups: Iterable, workers: int):
+        """
+        yield (size and partial hash, path) for files of groups with multiple files
+        """
+
+        def partial_hash(path: str):
+            return compute_fingerprint(Path(path), hashlib.md5, limit=PARTIAL_SIZE)
 
-    def _find_dupplicates_exif(self, files: Set[MultimediaFile], min: float = 0.9):
-        files = sorted(files)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for size, paths in groups:
+                if len(paths) > 1:
+                    for path, value in zip(paths, executor.map(partial_hash, paths)):
+                        yield f"{size}:{value}", path
+
+    def _check_against(self, args: Namespace):
+        """
+        report files whose content is already in the library index
+        """
+        if not args.against.is_file():
+            raise ValueError(f"Cannot find index {args.against}")
+        with FingerprintIndex(args.against) as index:
+            # files with a size not in the library cannot be known
+            files = MultimediaFile.filter_map(
+                f
+                for f in visit(args.files, recursive=True)
+                if f.is_file() and index.find(f.stat().st_size)
+            )
+            for item, fingerprint in preload(
+                files, lambda x: x.fingerprint(index.func), **preload_kwargs(args)
+            ):
+                if fingerprint is None:
+                    continue
+                same = [
+                    path
+                    for path in index.find(item.size, fingerprint)
+                    if path != item.file.resolve() and path.exists()
+                ]
+                if len(same) > 0:
+                    print(f"Duplicate files with md5sum {fingerprint}:")
+                    for path in [item.file, *same]:
+                        print(f"  {label(path)}")
+
+    def _find_similar(self, args: Namespace):
+        """
+        find similar images with a perceptual hash
+        """
+        # pylint: disable=import-outside-toplevel
+        from ..phash import BKTree, check_dependencies, image_hash, is_image
+
+        check_dependencies()
+        files = [
+            f for f in visit(args.files, recursive=True) if f.is_file() and is_image(f)
+        ]
+        hashes = {}
+        with FingerprintIndex(args.index) as index:
+            for file in files:
+                hashes[file] = index.lookup(file, args.strategy)
+            missing = [f for f, value in hashes.items() if value is None]
+            # decoding images is cpu bound, use processes
+            with PROFILER.stage("phash"), ProcessPoolExecutor(args.jobs) as executor:
+                for file, value in zip(
+                    missing,
+                    executor.map(
+                        partial(image_hash, algo=args.strategy), missing, chunksize=16
+                    ),
+                ):
+                    # also remember files that cannot be decoded
+                    if value is None:
+                        print(f"{Fore.RED}Cannot decode {label(file)}{Style.RESET_ALL}")
+                    hashes[file] = value or ""
+                    index.store(file, args.strategy, hashes[file])
+
+        tree = BKTree()
+        for file, value in hashes.items():
+            if value:
+                tree.add(int(value, 16), file)
+        # files are reported once, with all similar files
+        reported = set()
+        for file, value in hashes.items():
+            if not value or file in reported:
+                continue
+            similar = [
+                (other, distance)
+                for other, distance in tree.search(int(value, 16), args.distance)
+                if other != file and other not in reported
+            ]
+            if len(similar) > 0:
+                reported.update([file, *map(itemgetter(0), similar)])
+                print("Potential duplicate found:")
+                print(f"  {label(file)} [{sizeof_fmt(file.stat().st_size)}]:")
+                for other, distance in sorted(similar, key=itemgetter(1, 0)):
+                    print(
+                        f"  {label(other)} [{sizeof_fmt(other.stat().st_size)}] (distance {distance})"
+                    )
+
+    def _merge(self, args: Namespace):
+        """
+        report duplicates from the index files of all shards
+        """
+        rows = (row for file in args.files for row in iter_index(file))
+        for key, paths in iter_to_groups_on_disk(
+            rows, lambda r: f"{r[1]}:{r[2]}", itemgetter(0), folder=args.temp_dir
+        ):
+            if len(paths) > 1:
+                print(f"Duplicate files with md5sum {key.split(':')[1]}:")
+                for path in sorted(paths):
+                    print(f"  {label(Path(path))}")
+
+    def _find_dupplicates_exif(self, files: List[MultimediaFile], min: float = 0.9):
+        """
+        files must be sorted
+        """
         while len(files) > 0:
             file, others = files[0], files[1:]
             duplicates = list(
@@ -82,14 +403,15 @@ class Dedup(Tool):
                     print(
                         f"  {label(dup)} [{sizeof_fmt(dup.size)}] ({int(value*100)}%)"
                     )
-            files.remove(file)
+            files.pop(0)
 
-    def _find_dupplicates_md5(self, files: Set[MultimediaFile]):
-        # build the md5 to files dict
-        md5_map = iter_to_map(set(files), lambda f: f.md5)
-        for md5, duplicates in md5_map.items():
-            # check if multiple files have the same md5
+    def _find_dupplicates_fingerprint(self, files: Set[MultimediaFile], func: callable):
+        # build the fingerprint to files dict
+        fingerprint_map = iter_to_map(set(files), lambda f: f.fingerprint(func))
+        name = fingerprint_name(func)
+        for fingerprint, duplicates in fingerprint_map.items():
+            # check if multiple files have the same fingerprint
             if len(duplicates) > 1:
-                print(f"Duplicate files with md5sum {md5}:")
+                print(f"Duplicate files with {name}sum {fingerprint}:")
                 for dup in sorted(duplicates, key=lambda x: x.file):
                     print(f"  {label(dup)}")
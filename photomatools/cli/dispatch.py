@@ -1,13 +1,12 @@
 import argparse
-import shutil
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
 
 from colorama import Fore
 
-from ..tools import label
+from ..tools import Progress, label
 from ..utils import visit
-from . import Tool
+from . import Tool, add_plan_arguments, plan_runner, run_plan
 
 
 class Dispatch(Tool):
@@ -38,8 +37,8 @@ class Dispatch(Tool):
             "--link",
             dest="operation",
             action="store_const",
-            const=self.link,
-            default=self.move,
+            const="link",
+            default="move",
             help="do symbolic links instead of moving files",
         )
         group.add_argument(
@@ -47,7 +46,7 @@ class Dispatch(Tool):
             "--copy",
             dest="operation",
             action="store_const",
-            const=self.copy,
+            const="copy",
             help="copy files instead of moving them",
         )
         parser.add_argument(
@@ -58,10 +57,11 @@ class Dispatch(Tool):
             type=Path,
             help="destination folder",
         )
+        add_plan_arguments(parser)
         parser.add_argument(
             "files",
             metavar="FILE",
-            nargs=argparse.ONE_OR_MORE,
+            nargs=argparse.ZERO_OR_MORE,
             type=Path,
             help="files to move/copy/link",
         )
@@ -70,6 +70,10 @@ class Dispatch(Tool):
         """
         process
         """
+        if args.plan_in or args.rollback:
+            return run_plan(args)
+        if not args.files:
+            raise ValueError("No file to dispatch")
 
         folder = args.output
         if not folder.is_dir():
@@ -80,48 +84,41 @@ class Dispatch(Tool):
         if len(subdirs) == 0:
             raise ValueError(f"Cannot find any folder in {folder}")
 
-        for source in visit(
-            args.files, recursive=args.recursive, yield_dir=args.directory
-        ):
-            try:
-                candidates = [d for d in subdirs if source.name.startswith(d.name)]
-                if len(candidates) == 0:
-                    raise ValueError(f"No matching subfolder in {folder}")
-                if len(candidates) > 1:
-                    raise ValueError(
-                        f"Too many matching subfolders: {', '.join(map(str, candidates))}"
-                    )
-                dest = candidates[0] / source.name
-                if source.resolve() == dest.resolve():
-                    print(f"Skip '{label(source)}': already in {label(dest.parent)}")
-                elif dest.exists():
-                    raise ValueError(f"'{dest}' already exists")
-                else:
-                    print(
-                        f"{args.operation.__name__} '{label(source)}' -> '{label(dest)}' {' (dryrun)' if args.dryrun else ''}"
-                    )
-                    if not args.dryrun:
-                        args.operation(source, dest)
-            except BaseException as e:  # pylint: disable=broad-except,invalid-name
-                print(f"{Fore.RED}Cannot process {source}: {e}{Fore.RESET}")
+        from ..plan import Operation  # pylint: disable=import-outside-toplevel
 
-    def move(self, source, dest):
-        """
-        move file
-        """
-        shutil.move(source, dest)
-
-    def copy(self, source, dest):
-        """
-        copy file
-        """
-        if source.is_dir():
-            shutil.copytree(source, dest)
-        else:
-            shutil.copy(source, dest)
-
-    def link(self, source, dest):
-        """
-        link file
-        """
-        dest.symlink_to(source.resolve())
+        progress = Progress(enabled=not args.quiet)
+        try:
+            with plan_runner(args) as runner:
+                for source in visit(
+                    args.files, recursive=args.recursive, yield_dir=args.directory
+                ):
+                    progress.update(source.name)
+                    try:
+                        candidates = [
+                            d for d in subdirs if source.name.startswith(d.name)
+                        ]
+                        if len(candidates) == 0:
+                            raise ValueError(f"No matching subfolder in {folder}")
+                        if len(candidates) > 1:
+                            raise ValueError(
+                                f"Too many matching subfolders: {', '.join(map(str, candidates))}"
+                            )
+                        dest = candidates[0] / source.name
+                        if source.resolve() == dest.resolve():
+                            progress.print(
+                                f"Skip '{label(source)}': already in {label(dest.parent)}"
+                            )
+                        elif runner.exists(dest):
+                            raise ValueError(f"'{dest}' already exists")
+                        else:
+                            # files are not changed in dryrun or plan mode
+                            mode = f" ({runner.mode})" if runner.mode else ""
+                            message = f"'{label(source)}' -> '{label(dest)}'{mode}"
+                            progress.print(f"{args.operation} {message}")
+                            runner.apply(Operation.create(args.operation, source, dest))
+                    except BaseException as e:  # pylint: disable=broad-except,invalid-name
+                        progress.print(
+                            f"{Fore.RED}Cannot process {source}: {e}{Fore.RESET}"
+                        )
+        finally:
+            progress.close()
@@ -0,0 +1,53 @@
+import argparse
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+
+from colorama import Fore, Style
+
+from ..index import FingerprintIndex, default_index_file
+from ..tools import label
+from . import Tool, preload_kwargs
+
+
+def report_error(file: Path, error: Exception):
+    """
+    print a file skipped by the index scan
+    """
+    print(f"{Fore.RED}Cannot index {label(file)}: {error}{Style.RESET_ALL}")
+
+
+class Index(Tool):
+    """
+    build or update the fingerprint index of a library
+    """
+
+    def configure_parser(self, parser: ArgumentParser):
+        """
+        configure the argument parser
+        """
+        parser.add_argument(
+            "--index",
+            metavar="FILE",
+            type=Path,
+            default=default_index_file(),
+            help=f"fingerprint index, default: {default_index_file()}",
+        )
+        parser.add_argument(
+            "folders",
+            nargs=argparse.ONE_OR_MORE,
+            type=Path,
+            help="folders to index",
+        )
+
+    def run(self, args: Namespace):
+        """
+        process
+        """
+        with FingerprintIndex(args.index) as index:
+            changed, removed, errors = index.scan(
+                args.folders, on_error=report_error, **preload_kwargs(args)
+            )
+        print(
+            f"Index {label(args.index)}: {changed} updated, {removed} removed, {errors} unreadable"
+        )
+        return 1 if errors else 0
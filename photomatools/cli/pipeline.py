@@ -0,0 +1,121 @@
+import argparse
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import List
+
+from colorama import Fore, Style
+
+from ..index import FingerprintIndex
+from ..model import EVENT_FORMAT, MultimediaFile
+from ..tools import label
+from ..utils import iter_to_map, visit
+from . import Tool, add_plan_arguments, run_plan
+from .rename import Rename
+
+
+class Pipeline(Tool):
+    """
+    rename files with their creation date, skip duplicates and dispatch them
+    in year folders, metadata and fingerprints are read once per file
+    """
+
+    def configure_parser(self, parser: ArgumentParser):
+        """
+        configure the argument parser
+        """
+        parser.add_argument(
+            "-o",
+            "--output",
+            type=Path,
+            default=Path.cwd(),
+            help="library folder containing the year folders, default is current directory",
+        )
+        parser.add_argument(
+            "-f",
+            "--format",
+            default=EVENT_FORMAT,
+            help=f"date format of the event label, default: {EVENT_FORMAT.replace('%', '%%')}",
+        )
+        parser.add_argument(
+            "--against",
+            type=Path,
+            metavar="INDEX",
+            help="also skip files already in a library index, see pmt index",
+        )
+        add_plan_arguments(parser)
+        parser.add_argument(
+            "files", nargs=argparse.ZERO_OR_MORE, type=Path, help="files to import"
+        )
+        # files are compared to the files of the same event in the year folder
+        parser.set_defaults(check=True)
+
+    def run(self, args: Namespace):
+        """
+        process
+        """
+        if args.plan_in or args.rollback:
+            return run_plan(args)
+        if not args.files:
+            raise ValueError("No file to import")
+        library = args.output
+        subdirs = (
+            [d for d in library.iterdir() if d.is_dir()] if library.is_dir() else []
+        )
+        rename = Rename()
+
+        # files already dispatched are not imported again
+        inputs = filter(
+            lambda f: f.parent not in subdirs, visit(args.files, recursive=True)
+        )
+        files = self.skip_duplicates(
+            rename.load_dated(inputs, args, fingerprint=True), args
+        )
+        events = {}
+        for event, items in rename.group_events(files, args.format).items():
+            folder = self.year_folder(library, subdirs, event, items[0])
+            events[(folder, event)] = items
+        return rename.rename_events(events, args)
+
+    def skip_duplicates(self, files: List[MultimediaFile], args: Namespace):
+        """
+        only keep the oldest of files with the same content, and files not
+        already in the library index
+        """
+        out = []
+        for duplicates in iter_to_map(files, lambda f: (f.size, f.md5)).values():
+            first, *others = sorted(duplicates)
+            for other in others:
+                print(
+                    f"Skip {label(other)}: {Fore.YELLOW}duplicate of {first}{Style.RESET_ALL}"
+                )
+            out.append(first)
+        if args.against:
+            if not args.against.is_file():
+                raise ValueError(f"Cannot find index {args.against}")
+            with FingerprintIndex(args.against) as index:
+                files, out = out, []
+                for item in files:
+                    same = [
+                        path
+                        for path in index.find(item.size, item.md5)
+                        if path != item.file.resolve() and path.exists()
+                    ]
+                    if len(same) > 0:
+                        print(
+                            f"Skip {label(item)}: {Fore.YELLOW}already in library as {same[0]}{Style.RESET_ALL}"
+                        )
+                    else:
+                        out.append(item)
+        return out
+
+    def year_folder(
+        self, library: Path, subdirs: List[Path], event: str, item: MultimediaFile
+    ):
+        """
+        the existing subfolder prefixing the event like pmt dispatch, or a new
+        folder named with the year
+        """
+        candidates = [d for d in subdirs if event.startswith(d.name)]
+        if len(candidates) > 0:
+            return max(candidates, key=lambda d: len(d.name))
+        return library / item.create_date.strftime("%Y")
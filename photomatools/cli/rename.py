@@ -1,13 +1,21 @@
 import argparse
+import os
+import re
 from argparse import ArgumentParser, Namespace
+from concurrent.futures.thread import ThreadPoolExecutor
+from datetime import datetime
+from operator import attrgetter
 from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
 
 from colorama import Fore, Style
 
-from ..model import MultimediaFile
-from ..tools import find_next_file_increment, label, preload
+from ..model import DATE_TAGS, EVENT_FORMAT, MultimediaFile
+from ..profiling import PROFILER
+from ..table import FileTable
+from ..tools import Progress, label, next_free_name, preload, skip_named
 from ..utils import visit
-from . import Tool
+from . import Tool, add_plan_arguments, plan_runner, preload_kwargs, run_plan
 
 
 class Rename(Tool):
@@ -15,6 +23,10 @@ class Rename(Tool):
     rename files with the creation date
     """
 
+    # only the creation date is needed, not -fast2 which stops reading
+    # videos at the mdat atom and misses the dates of a trailing moov atom
+    METADATA = {"tags": DATE_TAGS, "fast": 1}
+
     def configure_parser(self, parser: ArgumentParser):
         """
         configure the argument parser
@@ -33,82 +45,211 @@ class Rename(Tool):
             help="rename files and move them to a specific folder, default is current directory",
         )
         parser.add_argument(
-            "files", nargs=argparse.ONE_OR_MORE, type=Path, help="files to rename"
+            "-f",
+            "--format",
+            default=EVENT_FORMAT,
+            help=f"date format of the event label, default: {EVENT_FORMAT.replace('%', '%%')}",
+        )
+        parser.add_argument(
+            "--trust-names",
+            action="store_true",
+            help="skip files of the output folder already named without reading their metadata",
+        )
+        parser.add_argument(
+            "--verify",
+            type=int,
+            default=0,
+            metavar="N",
+            help="with --trust-names, still check N random files already named",
         )
+        add_plan_arguments(parser)
+        parser.add_argument(
+            "files", nargs=argparse.ZERO_OR_MORE, type=Path, help="files to rename"
+        )
+
+    def is_named(self, file: Path, args: Namespace):
+        """
+        check if the file is in the output folder and named <event>_<NNN>[.ext]
+        """
+        match = re.fullmatch(r"(.+)_[0-9]{3}(\.\w+)?", file.name)
+        if match is None or file.parent.resolve() != args.output.resolve():
+            return False
+        try:
+            datetime.strptime(match.group(1), args.format)
+            return True
+        except ValueError:
+            return False
 
     def run(self, args: Namespace):
         """
         process
         """
-        out = 0
+        if args.plan_in or args.rollback:
+            return run_plan(args)
+        if not args.files:
+            raise ValueError("No file to rename")
         folder = args.output
+        inputs = filter(lambda f: f.parent != folder, visit(args.files, recursive=True))
+        if args.trust_names:
+            inputs, skipped = skip_named(
+                inputs, lambda f: self.is_named(f, args), args.verify
+            )
+            print(f"Skip {skipped} file(s) already named")
+
+        files = self.load_dated(inputs, args)
+        events = {
+            (folder, event): items
+            for event, items in self.group_events(files, args.format).items()
+        }
+        return self.rename_events(events, args)
+
+    def load_dated(
+        self, inputs: Iterable[Path], args: Namespace, fingerprint: bool = False
+    ) -> List[MultimediaFile]:
+        """
+        read the creation date of the files in parallel, optionally with their
+        md5, files without date are reported and dropped
+        """
+
+        def load_date(item: MultimediaFile):
+            # also compute the sort key in the worker threads
+            item.sort_key  # pylint: disable=pointless-statement
+            if fingerprint:
+                item.md5  # pylint: disable=pointless-statement
+            return item.create_date
 
-        # sort input files by event
-        input_files = {}
-        for item, event in preload(
-            MultimediaFile.filter_map(
-                filter(lambda f: f.parent != folder, visit(args.files, recursive=True))
-            ),
-            lambda x: x.get_event_label(),
-            workers=args.jobs,
+        out = []
+        progress = Progress(enabled=not args.quiet)
+        for item, date in preload(
+            MultimediaFile.filter_map(inputs, **self.METADATA),
+            load_date,
+            **preload_kwargs(args),
+            progress=progress,
         ):
-            if event is None:
-                print(f"Cannot retrieve date in metadata: {label(item)}")
+            if date is None:
+                progress.print(f"Cannot retrieve date in metadata: {label(item)}")
             else:
-                if event not in input_files:
-                    input_files[event] = []
-                input_files[event].append(item)
-
-        # process input files
-        for event in sorted(input_files.keys()):
-            items = input_files[event]
-            # get all candidates in the target folder
-            candidates = []
-            if args.check:
-                candidates += list(
-                    MultimediaFile.filter_map(
-                        filter(lambda f: f.name.startswith(event), folder.iterdir())
-                    )
-                )
-            # process sorted photos of the event
-            for item in sorted(items):
-                try:
-                    # check photo already exits
-                    dupp = next(
-                        filter(
-                            lambda p: p.size == item.size and p.md5 == item.md5,
-                            candidates,
-                        ),
-                        None,
-                    )
-                    if dupp is not None and dupp != item:
-                        raise ValueError(f"Dupplicate of {dupp}")
+                out.append(item)
+        return out
 
-                    dest = find_next_file_increment(
-                        item.file, f"{event}_", item.ext, folder=folder
-                    )
-                    if item == dest:
-                        # check source is already named
-                        print(f"Skip {label(item)}: already named{Style.RESET_ALL}")
-                    elif args.dryrun:
-                        # check dryrun mode before renaming file
-                        print(
-                            f"Rename {label(item)} to {label(dest)} {Fore.CYAN}(dryrun){Style.RESET_ALL}"
-                        )
-                    else:
-                        dest = find_next_file_increment(
-                            item.file, f"{event}_", item.ext, folder=folder
-                        )
-                        print(f"Rename {label(item)} to {label(dest)}")
-                        item.move(dest)
-
-                    # if check mode, remember the new file
-                    if args.check:
-                        candidates.append(item)
-                except BaseException as ex:  # pylint: disable=broad-except
-                    print(
-                        f"{Fore.RED}Cannot rename {item}: {Style.BRIGHT}{ex}{Style.RESET_ALL}"
-                    )
-                    out = 1
+    def group_events(
+        self, files: List[MultimediaFile], fmt: str
+    ) -> Dict[str, List[MultimediaFile]]:
+        """
+        group files by event label, events are sorted by date
+        """
+        table = FileTable()
+        for item in files:
+            table.append(item.file, item.stat, item.create_date)
+        out = {}
+        for rows in table.group_indices("date", min_count=1):
+            event = files[rows[0]].get_event_label(fmt)
+            out.setdefault(event, []).extend(files[row] for row in rows)
+        return out
+
+    def rename_events(
+        self, events: Dict[Tuple[Path, str], List[MultimediaFile]], args: Namespace
+    ):
+        """
+        rename the files of each (folder, event), return the exit code
+        """
+        out = 0
+        # events have distinct prefixes, they are planned and executed in parallel
+        existing = {
+            folder: set(os.listdir(folder)) if folder.is_dir() else set()
+            for folder, _ in events
+        }
+
+        def plan(key: Tuple[Path, str]):
+            folder, event = key
+            return self.plan_event(event, events[key], folder, existing[folder], args)
+
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor, plan_runner(
+            args
+        ) as runner:
+            plans = list(executor.map(plan, events))
+            for lines, ret in executor.map(
+                lambda plan: self.execute_event(plan, runner), plans
+            ):
+                for line in lines:
+                    print(line)
+                out = out or ret
+        return out
 
+    def plan_event(
+        self,
+        event: str,
+        items: List[MultimediaFile],
+        folder: Path,
+        existing: Set[str],
+        args: Namespace,
+    ):
+        """
+        find the destination of the files of an event, names are reserved
+        from a listing of the output folder taken before any move,
+        return (item, destination, error) tuples
+        """
+        # get all candidates in the target folder
+        candidates = []
+        if args.check:
+            candidates += list(
+                MultimediaFile.filter_map(
+                    folder / name for name in sorted(existing) if name.startswith(event)
+                )
+            )
+        # process sorted photos of the event
+        with PROFILER.stage("sort"):
+            items = sorted(items, key=attrgetter("sort_key"))
+        out, reserved = [], set()
+        for item in items:
+            try:
+                # check photo already exits
+                dupp = next(
+                    filter(
+                        lambda p: p.size == item.size and p.md5 == item.md5,
+                        candidates,
+                    ),
+                    None,
+                )
+                if dupp is not None and dupp != item:
+                    raise ValueError(f"Dupplicate of {dupp}")
+                dest = next_free_name(
+                    item.file, f"{event}_", item.ext, folder, existing, reserved
+                )
+                reserved.add(dest.name)
+                out.append((item, dest, None))
+                # if check mode, remember the new file
+                if args.check:
+                    candidates.append(item)
+            except BaseException as ex:  # pylint: disable=broad-except
+                out.append((item, None, ex))
         return out
+
+    def execute_event(self, plan: list, runner):
+        """
+        move the files of an event with the plan runner, return the messages
+        and the exit code
+        """
+        from ..plan import Operation  # pylint: disable=import-outside-toplevel
+
+        out, lines = 0, []
+        for item, dest, error in plan:
+            try:
+                if error is not None:
+                    raise error
+                if item == dest:
+                    # check source is already named
+                    lines.append(f"Skip {label(item)}: already named{Style.RESET_ALL}")
+                else:
+                    # files are not renamed in dryrun or plan mode
+                    mode = (
+                        runner.mode and f" {Fore.CYAN}({runner.mode}){Style.RESET_ALL}"
+                    )
+                    lines.append(f"Rename {label(item)} to {label(dest)}{mode or ''}")
+                    runner.apply(Operation.create("move", item.file, dest))
+            except BaseException as ex:  # pylint: disable=broad-except
+                lines.append(
+                    f"{Fore.RED}Cannot rename {item}: {Style.BRIGHT}{ex}{Style.RESET_ALL}"
+                )
+                out = 1
+        return lines, out
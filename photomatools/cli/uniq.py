@@ -1,14 +1,15 @@
 import argparse
 import hashlib
+import re
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
 
 from colorama import Fore, Style
 
 from ..model import MultimediaFile
-from ..tools import label, preload
-from ..utils import visit
-from . import Tool
+from ..tools import Progress, label, preload, skip_named
+from ..utils import TreeHash, visit
+from . import Tool, add_plan_arguments, plan_runner, preload_kwargs, run_plan
 
 
 class Uniq(Tool):
@@ -16,6 +17,9 @@ class Uniq(Tool):
     rename files with their fingerprint
     """
 
+    # only the file type is needed for the extension
+    METADATA = {"tags": ("File:FileTypeExtension",), "fast": 3}
+
     def configure_parser(self, parser: ArgumentParser):
         """
         configure the argument parser
@@ -57,6 +61,13 @@ class Uniq(Tool):
             const=hashlib.sha512,
             help="use sha512 for fingerprint",
         )
+        group.add_argument(
+            "--b2tree",
+            dest="hash_fnc",
+            action="store_const",
+            const=TreeHash,
+            help="use a BLAKE2b tree hash for fingerprint, big files are hashed with multiple threads",
+        )
         parser.add_argument(
             "-r", "--recursive", action="store_true", help="visit folder content"
         )
@@ -79,7 +90,20 @@ class Uniq(Tool):
             help="rename files in specific folder",
         )
         parser.add_argument(
-            "files", nargs=argparse.ONE_OR_MORE, type=Path, help="files to rename"
+            "--trust-names",
+            action="store_true",
+            help="skip files already named with a fingerprint without reading them",
+        )
+        parser.add_argument(
+            "--verify",
+            type=int,
+            default=0,
+            metavar="N",
+            help="with --trust-names, still check N random files already named",
+        )
+        add_plan_arguments(parser)
+        parser.add_argument(
+            "files", nargs=argparse.ZERO_OR_MORE, type=Path, help="files to rename"
         )
         return parser
 
@@ -87,16 +111,33 @@ class Uniq(Tool):
         """
         process
         """
-        for source, filename in preload(
-            MultimediaFile.filter_map(visit(args.files, recursive=args.recursive)),
-            lambda x: x.fingerprint(args.hash_fnc),
-            workers=args.jobs,
-        ):
-            if filename is None:
-                print(
-                    f"{Fore.RED}Cannot compute fingerprint for '{source}'{Style.RESET_ALL}"
-                )
-            else:
+        if args.plan_in or args.rollback:
+            return run_plan(args)
+        if not args.files:
+            raise ValueError("No file to rename")
+        progress = Progress(enabled=not args.quiet)
+        files = visit(args.files, recursive=args.recursive)
+        if args.trust_names:
+            files, skipped = skip_named(
+                files, lambda f: self.is_named(f, args), args.verify
+            )
+            progress.print(
+                f"Skip {skipped} file(s) {Fore.YELLOW}already named{Style.RESET_ALL}"
+            )
+        from ..plan import Operation  # pylint: disable=import-outside-toplevel
+
+        with plan_runner(args) as runner:
+            for source, filename in preload(
+                MultimediaFile.filter_map(files, **self.METADATA),
+                lambda x: x.fingerprint(args.hash_fnc),
+                **preload_kwargs(args),
+                progress=progress,
+            ):
+                if filename is None:
+                    progress.print(
+                        f"{Fore.RED}Cannot compute fingerprint for '{source}'{Style.RESET_ALL}"
+                    )
+                    continue
                 if args.length:
                     filename = filename[: args.length]
                 if args.ext:
@@ -104,19 +145,26 @@ class Uniq(Tool):
                 target = (args.folder or source.file.parent) / filename
 
                 if source.file == target:
-                    print(
+                    progress.print(
                         f"'Skip {label(source)}': {Fore.YELLOW}already named{Style.RESET_ALL}"
                     )
-                elif target.exists():
-                    print(
+                elif runner.exists(target):
+                    progress.print(
                         f"Cannot rename '{label(source)}': '{label(target)}' {Fore.RED}already exists{Style.RESET_ALL}"
                     )
-                elif args.dryrun:
-                    print(
-                        f"Rename '{label(source)}' to '{label(target)}' {Fore.CYAN}(dryrun){Style.RESET_ALL}"
-                    )
                 else:
-                    print(
-                        f"Rename '{label(source)}' to '{label(target)}'{Style.RESET_ALL}"
+                    mode = runner.mode and f" {Fore.CYAN}({runner.mode})"
+                    progress.print(
+                        f"Rename '{label(source)}' to '{label(target)}'{mode or ''}{Style.RESET_ALL}"
                     )
-                    source.move(target)
+                    runner.apply(Operation.create("move", source.file, target))
+
+    def is_named(self, file: Path, args: Namespace):
+        """
+        check if the file is already named with a fingerprint
+        """
+        length = args.length or len(args.hash_fnc().hexdigest())
+        pattern = f"[0-9a-f]{{{length}}}" + (r"\.\w+" if args.ext else "")
+        return re.fullmatch(pattern, file.name) is not None and (
+            args.folder is None or file.parent.resolve() == args.folder.resolve()
+        )
@@ -0,0 +1,212 @@
+import argparse
+import bisect
+import hashlib
+import json
+import math
+import os
+import re
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import as_completed
+from pathlib import Path
+
+from colorama import Fore, Style
+
+from ..index import default_index_file, is_under, iter_index
+from ..tools import Progress, label
+from ..utils import TreeHash, fingerprint_name, hash_file, sizeof_fmt, visit
+from . import Tool, preload_kwargs
+
+ALGOS = {
+    "md5": hashlib.md5,
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "sha384": hashlib.sha384,
+    "sha512": hashlib.sha512,
+    "b2tree": TreeHash,
+}
+# files verified between two checkpoints
+BATCH_SIZE = 1000
+
+
+def fraction(value: str):
+    """
+    parse a fraction in ]0, 1]
+    """
+    try:
+        out = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid fraction: {value}") from None
+    if not 0 < out <= 1:
+        raise argparse.ArgumentTypeError(f"invalid fraction: {value}")
+    return out
+
+
+class Verify(Tool):
+    """
+    hash files again to detect silent corruption, against a fingerprint index
+    or their names given by pmt uniq
+    """
+
+    def configure_parser(self, parser: ArgumentParser):
+        """
+        configure the argument parser
+        """
+        parser.add_argument(
+            "--index",
+            metavar="FILE",
+            type=Path,
+            default=default_index_file(),
+            help=f"fingerprint index, see pmt index, default: {default_index_file()}",
+        )
+        parser.add_argument(
+            "--names",
+            action="store_true",
+            help="compare files to the fingerprint in their name instead of the index",
+        )
+        parser.add_argument(
+            "-a",
+            "--algo",
+            choices=ALGOS,
+            default="md5",
+            help="fingerprint algorithm, default: md5",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            metavar="FILE",
+            type=Path,
+            help=f"remember the last verified file every {BATCH_SIZE} files to resume an interrupted run",
+        )
+        parser.add_argument(
+            "--fraction",
+            type=fraction,
+            metavar="F",
+            help="only verify a fraction of the files, the next run with the same --checkpoint continues with the next ones",
+        )
+        parser.add_argument(
+            "folders",
+            nargs=argparse.ZERO_OR_MORE,
+            type=Path,
+            help="only verify the files of these folders, needed with --names",
+        )
+
+    def run(self, args: Namespace):
+        """
+        process
+        """
+        func = ALGOS[args.algo]
+        entries = sorted(self.load_entries(args))
+        cursor = None
+        if args.checkpoint is not None and args.checkpoint.exists():
+            cursor = json.loads(args.checkpoint.read_text()).get("cursor")
+        # continue after the last verified file
+        start = 0
+        if cursor is not None:
+            start = bisect.bisect_right([e[0] for e in entries], cursor)
+        if args.fraction is None:
+            selected = entries[start:]
+        else:
+            count = math.ceil(len(entries) * args.fraction)
+            selected = (entries[start:] + entries[:start])[:count]
+
+        counts = dict.fromkeys(("ok", "corrupted", "missing", "changed", "error"), 0)
+        size = 0
+        progress = Progress(total=len(selected), enabled=not args.quiet)
+        kwargs = preload_kwargs(args)
+        scheduler = kwargs["scheduler"]
+
+        def check(entry: tuple):
+            path, expected, stat = entry
+            try:
+                st = os.stat(path)
+                if stat is not None and (st.st_size, st.st_mtime_ns) != stat:
+                    return "changed", st.st_size, None
+                actual = hash_file(Path(path), func)
+                if not actual.startswith(expected):
+                    return "corrupted", st.st_size, actual
+                return "ok", st.st_size, None
+            except FileNotFoundError:
+                return "missing", 0, None
+            except OSError as e:  # pylint: disable=invalid-name
+                return "error", 0, e
+
+        # all files are sorted together, or by batches between checkpoints
+        batch_size = BATCH_SIZE if args.checkpoint else max(len(selected), 1)
+        try:
+            with scheduler.executor(kwargs["workers"]) as submit:
+                for offset in range(0, len(selected), batch_size):
+                    batch = scheduler.sort(
+                        selected[offset : offset + batch_size], lambda e: e[0]
+                    )
+                    task = scheduler.task(batch, check, lambda e: e[0])
+                    jobs = {submit(e[0], task, i): e for i, e in enumerate(batch)}
+                    for job in as_completed(jobs):
+                        path, expected, _ = jobs[job]
+                        state, length, value = job.result()
+                        counts[state] += 1
+                        size += length
+                        progress.update(os.path.basename(path), length)
+                        if state == "corrupted":
+                            message = f"{Fore.RED}Corrupted {label(Path(path))}: "
+                            message += f"{Style.BRIGHT}expected {expected}, got {value}"
+                            progress.print(message + Style.RESET_ALL)
+                        elif state == "missing":
+                            progress.print(
+                                f"{Fore.YELLOW}Missing {path}{Style.RESET_ALL}"
+                            )
+                        elif state == "error":
+                            progress.print(
+                                f"{Fore.RED}Cannot verify {path}: {value}{Style.RESET_ALL}"
+                            )
+                        elif state == "changed" and args.verbose:
+                            progress.print(
+                                f"Skip {label(Path(path))}: changed since indexed"
+                            )
+                    if args.checkpoint is not None:
+                        end = min(offset + batch_size, len(selected))
+                        cursor = selected[end - 1][0]
+                        if args.fraction is None and end == len(selected):
+                            # the pass is complete, the next one starts from the beginning
+                            cursor = None
+                        self.save_checkpoint(args.checkpoint, cursor)
+        finally:
+            progress.close()
+
+        print(
+            f"Verify {len(selected)} file(s), {sizeof_fmt(size)}: "
+            + ", ".join(f"{count} {state}" for state, count in counts.items())
+        )
+        return 1 if counts["corrupted"] or counts["missing"] or counts["error"] else 0
+
+    def load_entries(self, args: Namespace):
+        """
+        yield (path, expected fingerprint, (size, mtime) or None) of the files
+        """
+        roots = [f.resolve() for f in args.folders] or None
+        if args.names:
+            if roots is None:
+                raise ValueError("--names needs the folders to verify")
+            # longer names were given by another algorithm
+            length = len(ALGOS[args.algo]().hexdigest())
+            pattern = rf"([0-9a-f]{{8,{length}}})(\.\w+)?"
+            for file in visit(roots, recursive=True):
+                match = re.fullmatch(pattern, file.name)
+                if match is not None:
+                    yield str(file), match.group(1), None
+            return
+        if not args.index.is_file():
+            raise ValueError(f"Cannot find index {args.index}")
+        for path, size, mtime, fingerprint in iter_index(
+            args.index,
+            fingerprint_name(ALGOS[args.algo]),
+            ("path", "size", "mtime", "fingerprint"),
+        ):
+            if is_under(path, roots):
+                yield path, fingerprint, (size, mtime)
+
+    def save_checkpoint(self, file: Path, cursor: str):
+        """
+        write the checkpoint atomically
+        """
+        tmp = file.with_name(f"{file.name}.tmp")
+        tmp.write_text(json.dumps({"cursor": cursor}))
+        os.replace(tmp, file)
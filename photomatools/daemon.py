@@ -0,0 +1,214 @@
+"""
+resident pmt process listening on a unix socket, keeping exiftool processes
+and caches warm between commands
+"""
+
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from os import getenv
+from pathlib import Path
+
+# environment variables of the client used by the commands
+FORWARDED_ENV = ("HOME", "LANG", "LANGUAGE", "NO_COLOR", "PATH", "TERM", "TMPDIR", "TZ")
+FORWARDED_ENV_PREFIXES = ("BORG_", "LC_", "PMT_", "XDG_")
+
+
+def default_socket():
+    """
+    socket used by the daemon and the client
+    """
+    # the entry point checks it without importing this module
+    # pylint: disable=import-outside-toplevel
+    from .cli.allinone import daemon_socket
+
+    return daemon_socket()
+
+
+def peer_uid(sock: socket.socket, path: Path):
+    """
+    user running the other end of the socket, or owning the socket file if
+    the system does not give the credentials of the peer
+    """
+    if hasattr(socket, "SO_PEERCRED"):
+        size = struct.calcsize("3i")
+        _, uid, _ = struct.unpack(
+            "3i", sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, size)
+        )
+        return uid
+    return path.stat().st_uid
+
+
+def forwarded_env(env: dict):
+    """
+    only keep the variables used by the commands
+    """
+    return {
+        k: v
+        for k, v in env.items()
+        if k in FORWARDED_ENV or k.startswith(FORWARDED_ENV_PREFIXES)
+    }
+
+
+@contextmanager
+def environment(cwd: str, env: dict):
+    """
+    temporarily use the directory and the environment of the client
+    """
+    previous = os.getcwd(), dict(os.environ)
+    os.chdir(cwd)
+    for key in forwarded_env(previous[1]):
+        del os.environ[key]
+    os.environ.update(forwarded_env(env))
+    try:
+        yield
+    finally:
+        os.chdir(previous[0])
+        os.environ.clear()
+        os.environ.update(previous[1])
+
+
+def send(stream, **message):
+    stream.write(json.dumps(message).encode() + b"\n")
+    stream.flush()
+
+
+class StreamWriter:
+    """
+    file like object forwarding lines to the client
+    """
+
+    def __init__(self, stream, name: str):
+        self.stream, self.name, self.buffer = stream, name, ""
+
+    def write(self, text: str):
+        self.buffer += text
+        if "\n" in self.buffer:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            send(self.stream, **{self.name: self.buffer})
+            self.buffer = ""
+
+    def isatty(self):
+        return False
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    run one pmt command sent by a client
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # connection closed without request, like the check of a new daemon
+            return
+        request = json.loads(line)
+        if request.get("stop"):
+            send(self.wfile, exit=0)
+            self.server.stopped = True
+            return
+        # commands run in the client directory and environment, one at a time
+        stdout = StreamWriter(self.wfile, "out")
+        stderr = StreamWriter(self.wfile, "err")
+        try:
+            with environment(request["cwd"], request["env"]):
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    code = self.server.handler(request["argv"])
+        except SystemExit as e:  # pylint: disable=invalid-name
+            code = e.code if isinstance(e.code, int) else 1
+        except BaseException as e:  # pylint: disable=broad-except,invalid-name
+            print(f"ERROR: {e}", file=stderr)
+            code = 1
+        finally:
+            stdout.flush()
+            stderr.flush()
+        send(self.wfile, exit=code)
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """
+    single threaded server, the commands are executed sequentially
+    """
+
+    def __init__(self, path: Path, handler: callable):
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if path.parent.stat().st_uid not in (0, os.getuid()):
+            raise ValueError(f"{path.parent} belongs to another user")
+        if path.exists():
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                try:
+                    client.connect(str(path))
+                except OSError:
+                    # left by a daemon that was killed
+                    path.unlink()
+                else:
+                    raise ValueError(f"A pmt daemon is already listening on {path}")
+        # create the socket only readable by the user
+        umask = os.umask(0o177)
+        try:
+            super().__init__(str(path), RequestHandler)
+        finally:
+            os.umask(umask)
+        self.path, self.handler, self.stopped = path, handler, False
+
+    def verify_request(self, request, client_address):
+        # only run the commands of the user running the daemon
+        return peer_uid(request, self.path) == os.getuid()
+
+    def serve(self):
+        try:
+            while not self.stopped:
+                self.handle_request()
+        finally:
+            self.server_close()
+            self.path.unlink()
+
+
+def forward(argv: list, path: Path = None):
+    """
+    run the command in the daemon if it is running, return the exit code
+    or None if there is no daemon
+    """
+    path = path or default_socket()
+    if not path.exists():
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(path))
+    except OSError:
+        client.close()
+        return None
+    with client, client.makefile("rwb") as stream:
+        if peer_uid(client, path) != os.getuid():
+            raise IOError(f"pmt daemon on {path} is run by another user")
+        send(stream, argv=argv, cwd=os.getcwd(), env=forwarded_env(os.environ))
+        for line in stream:
+            message = json.loads(line)
+            if "out" in message:
+                sys.stdout.write(message["out"])
+            elif "err" in message:
+                sys.stderr.write(message["err"])
+            elif "exit" in message:
+                sys.stdout.flush()
+                return message["exit"]
+    raise IOError("Connection to pmt daemon lost")
+
+
+def stop(path: Path = None):
+    """
+    stop the daemon
+    """
+    path = path or default_socket()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(path))
+        with client.makefile("rwb") as stream:
+            send(stream, stop=True)
+            stream.readline()
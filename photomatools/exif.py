@@ -0,0 +1,347 @@
+"""
+minimal native readers for the creation date of common photos/videos,
+used to avoid running exiftool when only the date is needed
+"""
+
+import os
+import re
+import struct
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from .utils import auto_datetime
+
+# exif tags from the Exif IFD
+EXIF_IFD_POINTER = 0x8769
+EXIF_TAGS = {
+    0x9003: "EXIF:DateTimeOriginal",
+    0x9004: "EXIF:CreateDate",
+    0x9011: "EXIF:OffsetTimeOriginal",
+    0x9012: "EXIF:OffsetTimeDigitized",
+    0x9291: "EXIF:SubSecTimeOriginal",
+    0x9292: "EXIF:SubSecTimeDigitized",
+}
+# key of the creation date in the QuickTime keys atom
+QUICKTIME_CREATIONDATE = b"com.apple.quicktime.creationdate"
+QUICKTIME_EPOCH = datetime(1904, 1, 1)
+HEIC_BRANDS = (b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx")
+VIDEO_BRANDS = {
+    b"qt  ": ("video/quicktime", "mov"),
+    b"isom": ("video/mp4", "mp4"),
+    b"iso2": ("video/mp4", "mp4"),
+    b"mp41": ("video/mp4", "mp4"),
+    b"mp42": ("video/mp4", "mp4"),
+    b"avc1": ("video/mp4", "mp4"),
+    b"M4V ": ("video/x-m4v", "m4v"),
+    b"3gp4": ("video/3gpp", "3gp"),
+    b"3gp5": ("video/3gpp", "3gp"),
+    b"3gp6": ("video/3gpp", "3gp"),
+}
+# tags that can be returned by read_native_metadata
+NATIVE_TAGS = (
+    "File:MIMEType",
+    "File:FileTypeExtension",
+    "Composite:SubSecDateTimeOriginal",
+    "Composite:SubSecCreateDate",
+    "QuickTime:CreationDate",
+    "QuickTime:CreateDate",
+    "QuickTime:MediaCreateDate",
+    *EXIF_TAGS.values(),
+)
+
+
+def read_native_metadata(file: Path):
+    """
+    read the creation date of JPEG, HEIC and MP4/QuickTime files without exiftool,
+    return exiftool like metadata or None if the format is not supported
+    or if no date is found
+    """
+    try:
+        with file.open("rb") as fp:
+            head = fp.read(12)
+            if head[:2] == b"\xff\xd8":
+                out = {"File:MIMEType": "image/jpeg", "File:FileTypeExtension": "jpg"}
+                out.update(_read_jpeg(fp))
+            elif head[4:8] == b"ftyp":
+                out = _read_isobmff(fp, os.fstat(fp.fileno()).st_size)
+            else:
+                return None
+    except (OSError, ValueError, struct.error):
+        return None
+    if out is None or not any(
+        auto_datetime(v) for k, v in out.items() if not k.startswith("File:")
+    ):
+        return None
+    return out
+
+
+def _read_jpeg(fp):
+    """
+    find the exif APP1 segment
+    """
+    fp.seek(2)
+    while True:
+        marker = fp.read(4)
+        if len(marker) < 4 or marker[0] != 0xFF or marker[1] in (0xD9, 0xDA):
+            # end of image or start of scan, no more metadata
+            return {}
+        (length,) = struct.unpack(">H", marker[2:])
+        if marker[1] == 0xE1:
+            data = fp.read(length - 2)
+            if data.startswith(b"Exif\0\0"):
+                return _read_tiff(data[6:])
+        else:
+            fp.seek(length - 2, os.SEEK_CUR)
+
+
+def _read_tiff(data: bytes):
+    """
+    read date tags from a tiff/exif block
+    """
+    endian = {b"II": "<", b"MM": ">"}.get(data[:2])
+    if endian is None:
+        raise ValueError("Invalid TIFF header")
+
+    def read_ifd(offset: int):
+        (count,) = struct.unpack_from(endian + "H", data, offset)
+        for i in range(count):
+            tag, kind, size, value = struct.unpack_from(
+                endian + "HHI4s", data, offset + 2 + i * 12
+            )
+            if kind == 2:
+                # ascii value, inline if it fits in 4 bytes
+                if size > 4:
+                    (start,) = struct.unpack(endian + "I", value)
+                    value = data[start : start + size]
+                yield tag, value[:size].rstrip(b"\0 ").decode("latin-1")
+            elif kind == 4:
+                yield tag, struct.unpack(endian + "I", value)[0]
+
+    (ifd0,) = struct.unpack_from(endian + "I", data, 4)
+    exif_ifd = dict(read_ifd(ifd0)).get(EXIF_IFD_POINTER)
+    if exif_ifd is None:
+        return {}
+    out = {EXIF_TAGS[t]: v for t, v in read_ifd(exif_ifd) if t in EXIF_TAGS and v}
+    for composite, date, subsec, offset in (
+        (
+            "Composite:SubSecDateTimeOriginal",
+            "EXIF:DateTimeOriginal",
+            "EXIF:SubSecTimeOriginal",
+            "EXIF:OffsetTimeOriginal",
+        ),
+        (
+            "Composite:SubSecCreateDate",
+            "EXIF:CreateDate",
+            "EXIF:SubSecTimeDigitized",
+            "EXIF:OffsetTimeDigitized",
+        ),
+    ):
+        # same as exiftool composite tags
+        if date in out:
+            value = out[date]
+            if subsec in out:
+                value += f".{out[subsec]}"
+            out[composite] = value + out.get(offset, "")
+    return out
+
+
+def _iter_boxes(fp, start: int, end: int):
+    """
+    iterate over iso bmff boxes, yield type, data start and end offsets
+    """
+    offset = start
+    while offset + 8 <= end:
+        fp.seek(offset)
+        size, kind = struct.unpack(">I4s", fp.read(8))
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack(">Q", fp.read(8))
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            raise ValueError(f"Invalid box {kind}")
+        yield kind, offset + header, min(offset + size, end)
+        offset += size
+
+
+def _find_box(fp, start: int, end: int, kind: bytes):
+    return next(((s, e) for k, s, e in _iter_boxes(fp, start, end) if k == kind), None)
+
+
+def _read_isobmff(fp, size: int):
+    """
+    read dates of HEIC images and MP4/QuickTime videos
+    """
+    ftyp = _find_box(fp, 0, size, b"ftyp")
+    fp.seek(ftyp[0])
+    data = fp.read(min(ftyp[1] - ftyp[0], 256))
+    brands = [data[i : i + 4] for i in range(0, len(data), 4) if i != 4]
+    if any(b in HEIC_BRANDS for b in brands):
+        meta = _find_box(fp, 0, size, b"meta")
+        if meta is None:
+            return None
+        out = {"File:MIMEType": "image/heic", "File:FileTypeExtension": "heic"}
+        out.update(_read_heic_exif(fp, meta[0] + 4, meta[1]))
+        return out
+    if brands[0] in VIDEO_BRANDS:
+        mime, ext = VIDEO_BRANDS[brands[0]]
+        out = {"File:MIMEType": mime, "File:FileTypeExtension": ext}
+        moov = _find_box(fp, 0, size, b"moov")
+        if moov is not None:
+            out.update(_read_moov(fp, *moov))
+        return out
+    return None
+
+
+def _read_heic_exif(fp, start: int, end: int):
+    """
+    locate the Exif item of a HEIC image
+    """
+    boxes = {k: (s, e) for k, s, e in _iter_boxes(fp, start, end)}
+    if b"iinf" not in boxes or b"iloc" not in boxes:
+        return {}
+    # find the id of the exif item
+    iinf_start, iinf_end = boxes[b"iinf"]
+    fp.seek(iinf_start)
+    version = fp.read(4)[0]
+    item_id = None
+    for kind, infe_start, _ in _iter_boxes(
+        fp, iinf_start + (6 if version == 0 else 8), iinf_end
+    ):
+        if kind == b"infe":
+            fp.seek(infe_start)
+            infe = fp.read(16)
+            if infe[0] == 2:
+                current, item_type = struct.unpack_from(">H2x4s", infe, 4)
+            elif infe[0] == 3:
+                current, item_type = struct.unpack_from(">I2x4s", infe, 4)
+            else:
+                continue
+            if item_type == b"Exif":
+                item_id = current
+                break
+    if item_id is None:
+        return {}
+    # find the location of the exif item
+    iloc_start, iloc_end = boxes[b"iloc"]
+    fp.seek(iloc_start)
+    data = fp.read(iloc_end - iloc_start)
+    version = data[0]
+    offset_size, length_size = data[4] >> 4, data[4] & 0x0F
+    base_offset_size, index_size = data[5] >> 4, data[5] & 0x0F
+    if version not in (1, 2):
+        index_size = 0
+
+    def read_int(position: int, size: int):
+        return int.from_bytes(data[position : position + size], "big"), position + size
+
+    count, pos = read_int(6, 2 if version < 2 else 4)
+    for _ in range(count):
+        current, pos = read_int(pos, 2 if version < 2 else 4)
+        method = 0
+        if version in (1, 2):
+            method, pos = read_int(pos, 2)
+        pos += 2  # data reference index
+        base_offset, pos = read_int(pos, base_offset_size)
+        extents, pos = read_int(pos, 2)
+        locations = []
+        for _ in range(extents):
+            pos += index_size
+            extent_offset, pos = read_int(pos, offset_size)
+            extent_length, pos = read_int(pos, length_size)
+            locations.append((base_offset + extent_offset, extent_length))
+        if current == item_id and method & 0x0F == 0 and len(locations) == 1:
+            fp.seek(locations[0][0])
+            exif = fp.read(locations[0][1])
+            (tiff_offset,) = struct.unpack_from(">I", exif)
+            exif = exif[4 + tiff_offset :]
+            if exif.startswith(b"Exif\0\0"):
+                exif = exif[6:]
+            return _read_tiff(exif)
+    return {}
+
+
+def _read_moov(fp, start: int, end: int):
+    """
+    read dates from the mvhd, mdhd and keys/ilst atoms
+    """
+    out = {}
+    for kind, box_start, box_end in _iter_boxes(fp, start, end):
+        if kind == b"mvhd":
+            out["QuickTime:CreateDate"] = _read_header_date(fp, box_start)
+        elif kind == b"trak" and "QuickTime:MediaCreateDate" not in out:
+            mdia = _find_box(fp, box_start, box_end, b"mdia")
+            mdhd = mdia and _find_box(fp, *mdia, b"mdhd")
+            if mdhd is not None:
+                out["QuickTime:MediaCreateDate"] = _read_header_date(fp, mdhd[0])
+        elif kind == b"meta":
+            fp.seek(box_start)
+            if fp.read(8)[4:] not in (b"hdlr", b"keys", b"ilst"):
+                # mp4 style meta is a full box
+                box_start += 4
+            value = _read_keys(fp, box_start, box_end, QUICKTIME_CREATIONDATE)
+            if value is not None:
+                out["QuickTime:CreationDate"] = _quicktime_date(value)
+    return out
+
+
+def _read_header_date(fp, start: int):
+    """
+    read the creation time of a mvhd/mdhd atom, formatted like exiftool
+    """
+    fp.seek(start)
+    data = fp.read(12)
+    seconds = struct.unpack_from(">I" if data[0] == 0 else ">Q", data, 4)[0]
+    if seconds == 0:
+        return "0000:00:00 00:00:00"
+    return (QUICKTIME_EPOCH + timedelta(seconds=seconds)).strftime("%Y:%m:%d %H:%M:%S")
+
+
+def _read_keys(fp, start: int, end: int, key: bytes):
+    """
+    read the value of a key from keys and ilst atoms
+    """
+    boxes = {k: (s, e) for k, s, e in _iter_boxes(fp, start, end)}
+    if b"keys" not in boxes or b"ilst" not in boxes:
+        return None
+    keys_start, keys_end = boxes[b"keys"]
+    fp.seek(keys_start)
+    data = fp.read(keys_end - keys_start)
+    (count,) = struct.unpack_from(">I", data, 4)
+    pos, index = 8, None
+    for i in range(1, count + 1):
+        (size,) = struct.unpack_from(">I", data, pos)
+        if data[pos + 8 : pos + size] == key:
+            index = i
+            break
+        pos += size
+    if index is None:
+        return None
+    for kind, item_start, item_end in _iter_boxes(fp, *boxes[b"ilst"]):
+        if int.from_bytes(kind, "big") == index:
+            for sub, data_start, data_end in _iter_boxes(fp, item_start, item_end):
+                if sub == b"data":
+                    fp.seek(data_start + 8)
+                    return fp.read(data_end - data_start - 8).decode("utf-8")
+    return None
+
+
+def _quicktime_date(text: str):
+    """
+    format an iso date like exiftool: 2020:02:24 17:05:01+01:00
+    """
+    match = re.fullmatch(
+        r"(\d{4})-(\d{2})-(\d{2})T(\d{2}:\d{2}:\d{2}(?:\.\d+)?)"
+        r"(?:([+-]\d{2}):?(\d{2})|(Z))?",
+        text.strip(),
+    )
+    if match is None:
+        return text
+    year, month, day, time, tz_hours, tz_minutes, utc = match.groups()
+    out = f"{year}:{month}:{day} {time}"
+    if utc:
+        out += "+00:00"
+    elif tz_hours:
+        out += f"{tz_hours}:{tz_minutes}"
+    return out
@@ -0,0 +1,263 @@
+import hashlib
+import os
+import sqlite3
+import zlib
+from dataclasses import dataclass
+from operator import itemgetter
+from os import getenv
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from cached_property import cached_property
+
+from .profiling import PROFILER
+from .utils import (
+    PARTIAL_SIZE,
+    IOScheduler,
+    compute_fingerprint,
+    fingerprint_name,
+    visit,
+)
+
+# the index is a cache, it is recreated when the schema version changes
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT NOT NULL,
+    algo TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    device INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    partial TEXT NOT NULL,
+    PRIMARY KEY (path, algo)
+);
+CREATE INDEX IF NOT EXISTS files_size ON files (algo, size);
+CREATE INDEX IF NOT EXISTS files_fingerprint ON files (algo, fingerprint);
+"""
+
+
+def default_index_file():
+    """
+    default location of the fingerprint index
+    """
+    return (
+        Path(getenv("XDG_CACHE_HOME") or Path.home() / ".cache")
+        / "photomatools"
+        / "index.db"
+    )
+
+
+def in_shard(path: Path, shard: Tuple[int, int]):
+    """
+    check if the path belongs to the shard (index, count), paths must be
+    relative to the scanned folder to get the same shards on all machines
+    """
+    return shard is None or zlib.crc32(os.fsencode(path)) % shard[1] == shard[0]
+
+
+def iter_index(
+    file: Path,
+    algo: str = "md5",
+    columns: Tuple[str] = ("path", "size", "fingerprint"),
+):
+    """
+    read rows of an index without modifying it, (path, size, fingerprint)
+    by default
+    """
+    db = sqlite3.connect(f"{file.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        yield from db.execute(
+            f"SELECT {', '.join(columns)} FROM files WHERE algo = ?", (algo,)
+        )
+    finally:
+        db.close()
+
+
+def stat_key(file: Path):
+    """
+    values used to detect changed files
+    """
+    stat = file.stat()
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino, stat.st_dev)
+
+
+def is_under(path: str, roots: Iterable[Path]):
+    """
+    check if the path is one of the roots or inside one of them
+    """
+    return roots is None or any(
+        path == str(r) or path.startswith(f"{r}/") for r in roots
+    )
+
+
+def in_scan(path: str, roots: List[Path], shard: Tuple[int, int]):
+    """
+    check if the path is in one of the roots and in the shard of its root
+    """
+    return any(
+        is_under(path, [root]) and in_shard(Path(path).relative_to(root), shard)
+        for root in roots
+    )
+
+
+@dataclass
+class FingerprintIndex:
+    file: Path
+    func: callable = hashlib.md5
+
+    @cached_property
+    def db(self):
+        if not self.file.parent.exists():
+            self.file.parent.mkdir(parents=True)
+        out = sqlite3.connect(str(self.file))
+        if out.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            out.executescript("DROP TABLE IF EXISTS files")
+            out.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        out.executescript(SCHEMA)
+        return out
+
+    @cached_property
+    def algo(self):
+        return fingerprint_name(self.func)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if "db" in self.__dict__:
+            self.db.commit()
+            self.db.close()
+            del self.__dict__["db"]
+
+    def scan(
+        self,
+        roots: Iterable[Path],
+        workers: int = 4,
+        shard: Tuple[int, int] = None,
+        scheduler: IOScheduler = None,
+        on_error: callable = None,
+    ):
+        """
+        update the index with the content of the given folders,
+        only files with a new size, mtime or inode are hashed again,
+        optionally only files of a shard (index, count), files that cannot
+        be read are given to on_error(file, error) and skipped,
+        return the number of updated, removed and skipped files
+        """
+        if scheduler is None:
+            scheduler = IOScheduler()
+        roots = [Path(r).resolve() for r in roots]
+        known = {
+            row[0]: row[1:]
+            for row in self.db.execute(
+                "SELECT path, size, mtime, inode, device FROM files WHERE algo = ?",
+                (self.algo,),
+            )
+            if in_scan(row[0], roots, shard)
+        }
+        changed, errors = [], []
+        for file in (
+            f
+            for root in roots
+            for f in visit([root], recursive=True)
+            if in_shard(f.relative_to(root), shard)
+        ):
+            try:
+                key = stat_key(file)
+            except FileNotFoundError:
+                # removed during the scan
+                continue
+            except OSError as e:  # pylint: disable=invalid-name
+                known.pop(str(file), None)
+                errors.append((file, e))
+                continue
+            if known.pop(str(file), None) != key:
+                changed.append((file, key))
+            else:
+                PROFILER.count("index cache hits")
+
+        def load(item):
+            file, key = item
+            try:
+                return (
+                    str(file),
+                    self.algo,
+                    *key,
+                    compute_fingerprint(file, self.func),
+                    compute_fingerprint(file, self.func, limit=PARTIAL_SIZE),
+                )
+            except OSError as e:  # pylint: disable=invalid-name
+                failed.append((file, e))
+                return None
+
+        failed = []
+        changed = scheduler.sort(changed, itemgetter(0))
+        task = scheduler.task(changed, load, itemgetter(0))
+        with scheduler.executor(workers) as submit:
+            jobs = [submit(item[0], task, i) for i, item in enumerate(changed)]
+            self.db.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                filter(None, (job.result() for job in jobs)),
+            )
+        errors += failed
+        # remaining known files have been removed, the fingerprints of files
+        # that cannot be read are outdated
+        self.db.executemany(
+            "DELETE FROM files WHERE path = ? AND algo = ?",
+            [(path, self.algo) for path in known]
+            + [(str(file), self.algo) for file, _ in errors],
+        )
+        self.db.commit()
+        if on_error is not None:
+            for file, error in errors:
+                on_error(file, error)
+        return len(changed) - len(failed), len(known), len(errors)
+
+    def lookup(self, file: Path, algo: str):
+        """
+        fingerprint of an indexed file, None if unknown or if the file changed
+        """
+        file = file.resolve()
+        row = self.db.execute(
+            "SELECT size, mtime, inode, device, fingerprint FROM files"
+            " WHERE path = ? AND algo = ?",
+            (str(file), algo),
+        ).fetchone()
+        if row is not None and row[:4] == stat_key(file):
+            return row[4]
+        return None
+
+    def store(self, file: Path, algo: str, fingerprint: str, partial: str = ""):
+        """
+        add or update a fingerprint computed outside of the index
+        """
+        file = file.resolve()
+        self.db.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(file), algo, *stat_key(file), fingerprint, partial),
+        )
+
+    def find(
+        self, size: int, fingerprint: str = None, roots: Iterable[Path] = None
+    ) -> List[Path]:
+        """
+        find indexed files with the given size and fingerprint
+        """
+        if roots is not None:
+            roots = [Path(r).resolve() for r in roots]
+        if fingerprint is None:
+            rows = self.db.execute(
+                "SELECT path FROM files WHERE algo = ? AND size = ?",
+                (self.algo, size),
+            )
+        else:
+            rows = self.db.execute(
+                "SELECT path FROM files WHERE algo = ? AND size = ? AND fingerprint = ?",
+                (self.algo, size, fingerprint),
+            )
+        return [Path(path) for (path,) in rows if is_under(path, roots)]
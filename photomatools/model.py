@@ -1,38 +1,47 @@
 import hashlib
-import shutil
 from dataclasses import dataclass
+from datetime import datetime
 from functools import total_ordering
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Tuple
 
 from cached_property import cached_property
 
-from .utils import auto_datetime, compute_fingerprint, read_metadata
-
-
-def comp(a, b, func: callable = None, opposite: bool = False):
-    def ret(c):
-        return (c * -1) if opposite else c
-
-    if a == b:
-        return 0
-    if a is None:
-        return ret(-1)
-    if b is None:
-        return ret(1)
-    if func is not None:
-        a, b = func(a), func(b)
-    if a < b:
-        return ret(-1)
-    if a > b:
-        return ret(1)
-    return 0
+from .exif import NATIVE_TAGS, read_native_metadata
+from .profiling import PROFILER
+from .utils import (
+    auto_datetime,
+    cached,
+    compute_fingerprint,
+    read_metadata,
+)
+
+TYPE_TAGS = ("File:MIMEType", "File:FileTypeExtension")
+PHOTO_DATE_TAGS = (
+    "Composite:SubSecDateTimeOriginal",
+    "Composite:SubSecCreateDate",
+    "EXIF:DateTimeOriginal",
+    "EXIF:CreateDate",
+)
+VIDEO_DATE_TAGS = (
+    "QuickTime:CreationDate",
+    "QuickTime:CreateDate",
+    "QuickTime:MediaCreateDate",
+)
+# tags needed to compute the creation date
+DATE_TAGS = TYPE_TAGS + PHOTO_DATE_TAGS + VIDEO_DATE_TAGS
+EPOCH = datetime(1970, 1, 1)
+EVENT_FORMAT = r"%Y-%m-%d_%Hh%Mm%Ss"
 
 
 @dataclass
 @total_ordering
 class MultimediaFile:
     file: Path
+    # if set, only read these tags, full metadata are read on demand
+    tags: Tuple[str] = None
+    # exiftool -fast level used with tags
+    fast: int = 0
 
     def __post_init__(self, *args, **kwargs):  # pylint: disable=unused-argument
         if isinstance(self.file, str):
@@ -43,8 +52,8 @@ class MultimediaFile:
             raise ValueError(f"Invalid file {self.file}")
 
     @classmethod
-    def filter_map(cls, iterable: Iterable[Path]):
-        return map(MultimediaFile, filter(Path.is_file, iterable))
+    def filter_map(cls, iterable: Iterable[Path], **kwargs):
+        return map(lambda f: cls(f, **kwargs), filter(Path.is_file, iterable))
 
     def __hash__(self):
         return hash(self.file.resolve())
@@ -68,21 +77,29 @@ class MultimediaFile:
     def __lt__(self, other):
         if not isinstance(other, MultimediaFile):
             return NotImplemented
-        # older first
-        out = comp(
-            self.create_date, other.create_date, lambda d: d.replace(tzinfo=None)
+        return self.sort_key < other.sort_key
+
+    @cached_property
+    def sort_key(self):
+        """
+        older first, then bigger first, then compare files
+        """
+        date = self.create_date
+        return (
+            date is not None,
+            (date.replace(tzinfo=None) - EPOCH).total_seconds() if date else 0,
+            -self.size,
+            self.file,
         )
-        if out == 0:
-            # bigger first
-            out = comp(self.size, other.size, opposite=True)
-            if out == 0:
-                # compare files
-                out = comp(self.file, other.file)
-        return out == -1
+
+    @cached_property
+    def stat(self):
+        PROFILER.count("stat calls")
+        return self.file.stat()
 
     @property
     def size(self):
-        return self.file.stat().st_size
+        return self.stat.st_size
 
     @property
     def ext(self):
@@ -103,6 +120,23 @@ class MultimediaFile:
     def metadata(self):
         return read_metadata(self.file)
 
+    @cached_property
+    def projected_metadata(self):
+        if self.projection <= {t.lower() for t in NATIVE_TAGS}:
+            # try to avoid running exiftool
+            with PROFILER.stage("native metadata"):
+                out = cached(
+                    self.file, ("native",), lambda: read_native_metadata(self.file)
+                )
+            if out is not None:
+                PROFILER.count("native metadata hits")
+                return out
+        return read_metadata(self.file, tags=self.tags, fast=self.fast)
+
+    @cached_property
+    def projection(self):
+        return {t.lower() for t in self.tags or ()}
+
     def iter_key_value(self, prefix: str = None):
         for k, v in self.metadata.items():
             if prefix is None or k.lower().startswith(f"{prefix.lower()}:"):
@@ -112,19 +146,9 @@ class MultimediaFile:
     def create_date(self):
         keys = tuple()
         if self.is_photo():
-            keys = (
-                "Composite:SubSecDateTimeOriginal",
-                "Composite:SubSecCreateDate",
-                "EXIF:DateTimeOriginal",
-                "EXIF:CreateDate",
-            )
+            keys = PHOTO_DATE_TAGS
         elif self.is_video():
-            keys = (
-                "QuickTime:CreationDate",
-                "QuickTime:CreateDate",
-                "QuickTime:MediaCreateDate",
-                "QuickTime:CreationDate",
-            )
+            keys = VIDEO_DATE_TAGS
 
         return next(
             filter(
@@ -165,10 +189,12 @@ class MultimediaFile:
                     diff += 1
         return idem / (idem + diff) if idem + diff else 0
 
-    def __clean_cached_properties(self, keys: tuple = ("metadata",)):
-        for x in keys:
-            if x in self.__dict__:
-                del self.__dict__[x]
+    def release(self):
+        """
+        drop loaded metadata to save memory, they are read again on demand
+        """
+        for key in ("metadata", "projected_metadata"):
+            self.__dict__.pop(key, None)
 
     def is_photo(self):
         return self.mime.startswith("image/")
@@ -177,19 +203,18 @@ class MultimediaFile:
         return self.mime.startswith("video/")
 
     def _get_metadata(self, key, default: str = None):
-        for k, v in self.metadata.items():
+        metadata = self.__dict__.get("metadata")
+        if metadata is None:
+            # use partial metadata if possible, fallback to a full read
+            if key.lower() in self.projection:
+                metadata = self.projected_metadata
+            else:
+                metadata = self.metadata
+        for k, v in metadata.items():
             if k.lower() == key.lower():
                 return v
         return default
 
-    def get_event_label(self, fmt: str = r"%Y-%m-%d_%Hh%Mm%Ss"):
+    def get_event_label(self, fmt: str = EVENT_FORMAT):
         dt = self.create_date
         return dt.strftime(fmt) if dt else None
-
-    def move(self, dest: Path, force: bool = False):
-        if dest.exists() and not force:
-            raise ValueError(f"{dest} already exists")
-        if not dest.parent.exists():
-            dest.parent.mkdir(parents=True)
-        self.file = shutil.move(self.file, dest)
-        self.__clean_cached_properties()
@@ -0,0 +1,143 @@
+"""
+perceptual hashes to find resized or recompressed copies of images,
+Pillow and numpy are optional dependencies
+"""
+
+from math import sqrt
+from pathlib import Path
+
+try:
+    import numpy
+    from PIL import Image, ImageOps
+except ImportError:
+    numpy = Image = ImageOps = None
+
+# size of the image used to compute the dct of the phash
+PHASH_SIZE = 32
+HASH_SIZE = 8
+
+
+def check_dependencies():
+    """
+    raise an error if Pillow or numpy are missing
+    """
+    if numpy is None or Image is None:
+        raise ImportError(
+            "Perceptual hashes need Pillow and numpy: pip install photomatools[phash]"
+        )
+
+
+def is_image(path: Path):
+    """
+    check if Pillow can probably decode the file given its extension
+    """
+    Image.init()
+    return path.suffix.lower() in Image.registered_extensions()
+
+
+def load_pixels(path: Path, size: tuple):
+    """
+    decode the image as a grayscale array of the given (width, height)
+    """
+    with Image.open(path) as image:
+        # let the jpeg decoder downscale the image, much faster than a full decode
+        image.draft("L", (size[0] * 4, size[1] * 4))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("L").resize(size, Image.LANCZOS)
+        return numpy.asarray(image, dtype=numpy.float64)
+
+
+def dct_matrix(size: int):
+    """
+    orthogonal DCT-II matrix, the dct of x is M @ x
+    """
+    k = numpy.arange(size)
+    out = numpy.cos(numpy.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * size))
+    out[0] /= sqrt(2)
+    return out * sqrt(2 / size)
+
+
+def to_hex(bits):
+    """
+    pack a boolean array as an hex string
+    """
+    return numpy.packbits(bits.flatten()).tobytes().hex()
+
+
+def dhash(path: Path):
+    """
+    difference hash: compare each pixel to its right neighbour
+    """
+    pixels = load_pixels(path, (HASH_SIZE + 1, HASH_SIZE))
+    return to_hex(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(path: Path):
+    """
+    dct hash: compare the low frequencies to their median
+    """
+    pixels = load_pixels(path, (PHASH_SIZE, PHASH_SIZE))
+    matrix = dct_matrix(PHASH_SIZE)
+    low = (matrix @ pixels @ matrix.T)[:HASH_SIZE, :HASH_SIZE]
+    return to_hex(low > numpy.median(low))
+
+
+def image_hash(path: Path, algo: str = "phash"):
+    """
+    compute the perceptual hash of an image, None if it cannot be decoded,
+    used in worker processes
+    """
+    try:
+        return {"phash": phash, "dhash": dhash}[algo](path)
+    # decoders also raise DecompressionBombError, SyntaxError or their own errors
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+
+def hamming(left: int, right: int):
+    """
+    number of different bits
+    """
+    return bin(left ^ right).count("1")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree to find hashes within a hamming distance without
+    comparing all of them
+    """
+
+    def __init__(self):
+        # node is (value, items, {distance: child})
+        self.root = None
+
+    def add(self, value: int, item):
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            if distance not in node[2]:
+                node[2][distance] = (value, [item], {})
+                return
+            node = node[2][distance]
+
+    def search(self, value: int, maximum: int):
+        """
+        yield (item, distance) for items within the distance of the value
+        """
+        nodes = [self.root] if self.root is not None else []
+        while nodes:
+            node = nodes.pop()
+            distance = hamming(value, node[0])
+            if distance <= maximum:
+                for item in node[1]:
+                    yield item, distance
+            # triangle inequality, other children cannot match
+            for child_distance, child in node[2].items():
+                if distance - maximum <= child_distance <= distance + maximum:
+                    nodes.append(child)
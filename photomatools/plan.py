@@ -0,0 +1,262 @@
+"""
+file operations computed by a tool, saved in a plan file to review them and
+execute them later, and an append-only journal to resume or rollback a run
+"""
+
+import json
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Iterator, List, Tuple
+
+from .index import stat_key
+from .profiling import PROFILER
+from .utils import move_file
+
+PLAN_VERSION = 1
+ACTIONS = ("move", "copy", "link")
+
+
+@dataclass(frozen=True)
+class Operation:
+    action: str
+    source: Path
+    dest: Path
+    # stat of the source when the operation was planned
+    stat: Tuple[int, int, int, int] = None
+
+    @classmethod
+    def create(cls, action: str, source: Path, dest: Path):
+        """
+        new operation remembering the current state of the source
+        """
+        if action not in ACTIONS:
+            raise ValueError(f"Invalid action: {action}")
+        return cls(action, source.absolute(), dest.absolute(), stat_key(source))
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            data["action"],
+            Path(data["source"]),
+            Path(data["dest"]),
+            tuple(data["stat"]) if data.get("stat") else None,
+        )
+
+    def to_dict(self):
+        return {
+            "action": self.action,
+            "source": str(self.source),
+            "dest": str(self.dest),
+            "stat": self.stat,
+        }
+
+    @property
+    def key(self):
+        """
+        identify the operation in a journal
+        """
+        return self.action, str(self.source), str(self.dest)
+
+    def check(self):
+        """
+        check the source did not change since the operation was planned
+        """
+        if not os.path.lexists(self.source):
+            raise ValueError(f"{self.source} does not exist anymore")
+        if self.stat is not None and stat_key(self.source) != self.stat:
+            raise ValueError(f"{self.source} changed since the plan was made")
+        if os.path.lexists(self.dest):
+            raise ValueError(f"{self.dest} already exists")
+
+    def execute(self):
+        self.check()
+        # events executed in parallel can create the same folder
+        self.dest.parent.mkdir(parents=True, exist_ok=True)
+        with PROFILER.stage(self.action):
+            if self.action == "move":
+                move_file(self.source, self.dest)
+            elif self.source.is_dir() and self.action == "copy":
+                shutil.copytree(self.source, self.dest)
+            elif self.action == "copy":
+                shutil.copy(self.source, self.dest)
+            else:
+                self.dest.symlink_to(self.source.resolve())
+
+    def undo(self):
+        if self.action == "move":
+            if os.path.lexists(self.source):
+                raise ValueError(f"{self.source} already exists")
+            move_file(self.dest, self.source)
+        elif self.dest.is_dir() and not self.dest.is_symlink():
+            shutil.rmtree(self.dest)
+        else:
+            self.dest.unlink()
+
+    def is_done(self):
+        """
+        guess if an interrupted operation completed
+        """
+        if self.action == "move":
+            return not os.path.lexists(self.source) and os.path.lexists(self.dest)
+        # a partial copy cannot be detected, it is done again
+        return False
+
+
+class Plan:
+    """
+    ordered list of operations, saved as json lines after a version header
+    """
+
+    def __init__(self, operations: List[Operation] = None):
+        self.operations = operations or []
+
+    def __len__(self):
+        return len(self.operations)
+
+    def __iter__(self):
+        return iter(self.operations)
+
+    def append(self, operation: Operation):
+        self.operations.append(operation)
+
+    def save(self, file: Path):
+        with file.open("w") as out:
+            out.write(json.dumps({"version": PLAN_VERSION}) + "\n")
+            for operation in self.operations:
+                out.write(json.dumps(operation.to_dict()) + "\n")
+
+    @classmethod
+    def load(cls, file: Path):
+        with file.open() as lines:
+            header = json.loads(next(lines, "{}"))
+            if header.get("version") != PLAN_VERSION:
+                raise ValueError(f"Invalid plan file: {file}")
+            return cls([Operation.from_dict(json.loads(line)) for line in lines])
+
+
+class Journal:
+    """
+    append-only record of executed operations, lines are flushed when written
+    so that an interrupted run can be resumed or rolled back,
+    operations are executed without journal if the file is None
+    """
+
+    def __init__(self, file: Path = None):
+        self.file = file
+        self.lock = Lock()
+        # key -> (operation, last state) of the operations of the journal
+        self.states = {}
+        self.output = None
+        if file is not None:
+            line = "\n"
+            if file.exists():
+                with file.open() as lines:
+                    for line in lines:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # last line written when the process was killed
+                            continue
+                        operation = Operation.from_dict(entry)
+                        self.states.pop(operation.key, None)
+                        self.states[operation.key] = (operation, entry["state"])
+            self.output = file.open("a")
+            if not line.endswith("\n"):
+                # terminate the partial last line
+                self.output.write("\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.output is not None:
+            self.output.flush()
+            os.fsync(self.output.fileno())
+            self.output.close()
+            self.output = None
+
+    def write(self, operation: Operation, state: str):
+        with self.lock:
+            # keep the states in the order of the last change
+            self.states.pop(operation.key, None)
+            self.states[operation.key] = (operation, state)
+            if self.output is not None:
+                entry = {**operation.to_dict(), "state": state}
+                self.output.write(json.dumps(entry) + "\n")
+                self.output.flush()
+
+    def state(self, operation: Operation):
+        return self.states.get(operation.key, (None, None))[1]
+
+    def execute(self, operation: Operation):
+        """
+        execute the operation unless the journal says it is done,
+        return False if it was skipped
+        """
+        state = self.state(operation)
+        if state == "done" or (state == "start" and operation.is_done()):
+            if state == "start":
+                self.write(operation, "done")
+            return False
+        if state == "start" and operation.action != "move":
+            # remove the partial copy or link of the interrupted run
+            if os.path.lexists(operation.dest):
+                operation.undo()
+        self.write(operation, "start")
+        operation.execute()
+        self.write(operation, "done")
+        return True
+
+    def done(self) -> Iterator[Operation]:
+        """
+        operations done and not undone, most recent first
+        """
+        for operation, state in reversed(list(self.states.values())):
+            if state == "done":
+                yield operation
+
+    def undo(self, operation: Operation):
+        operation.undo()
+        self.write(operation, "undone")
+
+
+class Runner:
+    """
+    execute the operations computed by a tool through a journal, or only
+    record them in dryrun mode or to save a plan
+    """
+
+    def __init__(self, journal: Path = None, plan: bool = False, dryrun: bool = False):
+        self.journal = Journal(journal)
+        self.mode = "planned" if plan else "dryrun" if dryrun else None
+        self.plan = Plan()
+        # destinations of recorded operations, they do not exist yet
+        self.destinations = set()
+        self.lock = Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.journal.close()
+
+    def exists(self, path: Path):
+        """
+        check if the path exists or will exist after the recorded operations
+        """
+        return os.path.lexists(path) or path.absolute() in self.destinations
+
+    def apply(self, operation: Operation):
+        if self.mode is None:
+            self.journal.execute(operation)
+            return
+        with self.lock:
+            self.destinations.add(operation.dest)
+            if self.mode == "planned":
+                self.plan.append(operation)
@@ -0,0 +1,141 @@
+"""
+per stage timing and counters, disabled by default
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Profiler:
+    """
+    record wall/cpu time per stage, counters and optionally trace events
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        # stage name -> [calls, wall time, cpu time]
+        self.stages = defaultdict(lambda: [0, 0.0, 0.0])
+        self.counters = defaultdict(int)
+        self.events = None
+        self.threads = {}
+        self.profile = None
+        self.start = (time.perf_counter(), time.process_time())
+
+    def enable(self, trace: bool = False, profile: bool = False):
+        """
+        start recording, trace events are needed for chrome trace timelines
+        """
+        self.enabled = True
+        self.start = (time.perf_counter(), time.process_time())
+        self.stages.clear()
+        self.counters.clear()
+        self.threads.clear()
+        self.events = [] if trace else None
+        if profile:
+            import cProfile  # pylint: disable=import-outside-toplevel
+
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        measure the time spent in the block
+        """
+        if not self.enabled:
+            yield
+            return
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - wall
+            cpu_time = time.thread_time() - cpu
+            thread = threading.current_thread()
+            with self.lock:
+                stage = self.stages[name]
+                stage[0] += 1
+                stage[1] += wall_time
+                stage[2] += cpu_time
+                if self.events is not None:
+                    self.threads[thread.ident] = thread.name
+                    self.events.append(
+                        {
+                            "name": name,
+                            "ph": "X",
+                            "ts": (wall - self.start[0]) * 1e6,
+                            "dur": wall_time * 1e6,
+                            "pid": os.getpid(),
+                            "tid": thread.ident,
+                        }
+                    )
+
+    def count(self, name: str, value: int = 1):
+        """
+        increment a counter
+        """
+        if self.enabled:
+            with self.lock:
+                self.counters[name] += value
+
+    def summary(self):
+        """
+        human readable summary of stages and counters
+        """
+        wall = time.perf_counter() - self.start[0]
+        cpu = time.process_time() - self.start[1]
+        width = max(map(len, [*self.stages, *self.counters, "stage"]))
+        yield f"Profile: wall {wall:.3f}s, cpu {cpu:.3f}s"
+        if self.stages:
+            yield f"  {'stage'.ljust(width)} {'calls':>8} {'wall':>10} {'cpu':>10}"
+            for name, (calls, wall_time, cpu_time) in sorted(
+                self.stages.items(), key=lambda kv: kv[1][1], reverse=True
+            ):
+                yield (
+                    f"  {name.ljust(width)} {calls:>8}"
+                    f" {wall_time:>9.3f}s {cpu_time:>9.3f}s"
+                )
+        for name, value in sorted(self.counters.items()):
+            yield f"  {name.ljust(width)} {value:>8}"
+
+    def write_trace(self, file: Path):
+        """
+        write a chrome trace event file, see chrome://tracing
+        """
+        names = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "tid": tid,
+                "args": {"name": name},
+            }
+            for tid, name in self.threads.items()
+        ]
+        file.write_text(json.dumps({"traceEvents": names + (self.events or [])}))
+
+    def stop(self, summary: bool = True, trace: Path = None, profile: Path = None):
+        """
+        stop recording and write results
+        """
+        if not self.enabled:
+            return
+        if self.profile is not None:
+            self.profile.disable()
+            if profile is not None:
+                self.profile.dump_stats(str(profile))
+        if trace is not None:
+            self.write_trace(trace)
+        if summary:
+            print(*self.summary(), sep="\n", file=sys.stderr)
+        self.enabled = False
+
+
+PROFILER = Profiler()
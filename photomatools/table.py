@@ -0,0 +1,172 @@
+"""
+columnar storage of scan results with a group-by, vectorized with numpy
+if it is installed
+"""
+
+import itertools
+import os
+import stat
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, List
+
+from .model import EPOCH
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# column name and array typecode
+COLUMNS = {
+    "size": "q",
+    "mtime": "q",
+    "inode": "Q",
+    "device": "Q",
+    "date": "q",
+    "hash": "q",
+}
+# value of the date and hash columns when unknown
+MISSING = -(2 ** 63)
+
+
+def timestamp(date: datetime):
+    """
+    local time of the date in seconds, so that files of the same event have
+    the same value whatever their timezone
+    """
+    return int((date.replace(tzinfo=None, microsecond=0) - EPOCH).total_seconds())
+
+
+def hash_prefix(fingerprint: str):
+    """
+    first 64 bits of an hex digest as a signed integer
+    """
+    return int.from_bytes(bytes.fromhex(fingerprint[:16]), "big", signed=True)
+
+
+class PathStore:
+    """
+    paths packed in a single buffer, much smaller than a list of Path
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> Path:
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return Path(os.fsdecode(bytes(self.data[start:end])))
+
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
+
+    def append(self, path: Path):
+        self.data += os.fsencode(path)
+        self.offsets.append(len(self.data))
+
+
+class FileTable:
+    """
+    one row per file, with integer columns and the paths in a PathStore
+    """
+
+    def __init__(self):
+        self.paths = PathStore()
+        self.columns = {name: array(code) for name, code in COLUMNS.items()}
+
+    def __len__(self):
+        return len(self.paths)
+
+    @classmethod
+    def scan(cls, files: Iterable[Path]):
+        """
+        build a table with the regular files
+        """
+        out = cls()
+        for file in files:
+            try:
+                st = file.stat()
+            except OSError:
+                # broken links
+                continue
+            if stat.S_ISREG(st.st_mode):
+                out.append(file, st)
+        return out
+
+    def append(self, path: Path, st: os.stat_result = None, date: datetime = None):
+        """
+        add a row and return its index
+        """
+        if st is None:
+            st = path.stat()
+        self.paths.append(path)
+        for name, value in (
+            ("size", st.st_size),
+            ("mtime", st.st_mtime_ns),
+            ("inode", st.st_ino),
+            ("device", st.st_dev),
+            ("date", MISSING if date is None else timestamp(date)),
+            ("hash", MISSING),
+        ):
+            self.columns[name].append(value)
+        return len(self) - 1
+
+    def column(self, name: str):
+        """
+        numpy view of a column, or the array if numpy is not available
+        """
+        if numpy is None:
+            return self.columns[name]
+        out = self.columns[name]
+        return numpy.frombuffer(out, dtype=out.typecode)
+
+    def group_indices(
+        self, *names: str, rows: Iterable[int] = None, min_count: int = 2
+    ) -> Iterator[List[int]]:
+        """
+        yield the indices of rows with the same values in the given columns,
+        groups are sorted by value and rows keep their order in a group
+        """
+        if numpy is None:
+            yield from self._group_indices_python(names, rows, min_count)
+            return
+        if rows is None:
+            rows = numpy.arange(len(self), dtype=numpy.int64)
+        else:
+            rows = numpy.fromiter(rows, dtype=numpy.int64)
+        if len(rows) == 0:
+            return
+        keys = [self.column(name)[rows] for name in names]
+        # lexsort is stable and uses the last key as primary key
+        order = numpy.lexsort(keys[::-1])
+        rows = rows[order]
+        changes = numpy.zeros(len(rows) - 1, dtype=bool)
+        for key in keys:
+            key = key[order]
+            changes |= key[1:] != key[:-1]
+        bounds = numpy.flatnonzero(changes) + 1
+        starts = numpy.concatenate(([0], bounds))
+        ends = numpy.concatenate((bounds, [len(rows)]))
+        selected = ends - starts >= min_count
+        for start, end in zip(starts[selected], ends[selected]):
+            yield rows[start:end].tolist()
+
+    def _group_indices_python(self, names, rows, min_count):
+        columns = [self.columns[name] for name in names]
+        if len(columns) == 1:
+            key = columns[0].__getitem__
+        else:
+
+            def key(row):
+                return tuple(column[row] for column in columns)
+
+        rows = sorted(range(len(self)) if rows is None else rows, key=key)
+        for _, group in itertools.groupby(rows, key):
+            group = list(group)
+            if len(group) >= min_count:
+                yield group
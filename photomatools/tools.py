@@ -1,35 +1,60 @@
 import concurrent
-from concurrent.futures.thread import ThreadPoolExecutor
+import io
+import itertools
+import random
+import shutil
+import sys
+import time
+from datetime import timedelta
+from operator import attrgetter
 from pathlib import Path
-from typing import Dict, Iterable
+from typing import Dict, Iterable, Set
 
-from colorama import Cursor, Fore, Style
+from colorama import Fore, Style
+from colorama.ansi import clear_line
 
 from .model import MultimediaFile
-from .utils import print_temp_message
+from .profiling import PROFILER
+from .utils import IOScheduler, print_temp_message, sizeof_fmt
 
+# files submitted together by preload in walk order or with bounded memory
+PRELOAD_BATCH_SIZE = 1000
 
-def find_next_file_increment(
+
+def next_free_name(
     source: Path,
     prefix: str,
     suffix: str,
-    folder: Path = None,
-    start: int = 1,
+    folder: Path,
+    existing: Set[str],
+    reserved: Set[str],
     digits: int = 3,
 ) -> Path:
     """
-    find the next increment to name a file xxx<INT>yyy
+    find the next increment to name a file xxx<INT>yyy using the names of
+    existing files instead of checking the folder, reserved names cannot be used
     """
-    if folder is None:
-        folder = source.parent
-    for i in range(start, pow(10, digits)):
-        i = str(i).zfill(digits)
-        out = folder / f"{prefix}{i}{suffix}"
-        if not out.exists() or out.resolve() == source.resolve():
+    for i in range(1, pow(10, digits)):
+        out = folder / f"{prefix}{str(i).zfill(digits)}{suffix}"
+        if out.name in reserved:
+            continue
+        if out.name not in existing or out.resolve() == source.resolve():
             return out
     raise ValueError(f"No possible increment to rename {source}")
 
 
+def skip_named(files: Iterable[Path], is_named: callable, verify: int = 0):
+    """
+    remove files already named, except a random sample of them to verify,
+    return the files to process and the number of skipped files
+    """
+    out, named = [], []
+    for file in files:
+        (named if is_named(file) else out).append(file)
+    verified = random.sample(named, min(verify, len(named)))
+    return out + verified, len(named) - len(verified)
+
+
 def label(item):
     """
     colorize item given its type
@@ -44,30 +69,134 @@ def label(item):
     return str(item)
 
 
+class Progress:
+    """
+    progress line refreshed at a fixed rate, disabled if stdout is not a terminal,
+    lines printed meanwhile are buffered and written with the progress line
+    """
+
+    def __init__(self, total: int = None, rate: float = 10, enabled: bool = True):
+        self.enabled = enabled and sys.stdout.isatty()
+        self.total, self.interval = total, 1 / rate
+        self.count, self.size, self.current = 0, 0, None
+        self.start = self.last = time.monotonic()
+        self.buffer = io.StringIO()
+        self.displayed = False
+
+    def update(self, current: str = None, size: int = 0):
+        """
+        count a processed item
+        """
+        self.count += 1
+        self.size += size
+        self.current = current
+        if self.enabled and time.monotonic() - self.last >= self.interval:
+            self.refresh()
+
+    def refresh(self):
+        """
+        write buffered lines and the progress line
+        """
+        self.last = time.monotonic()
+        elapsed = max(self.last - self.start, 1e-6)
+        message = f"{self.count}"
+        if self.total:
+            message += f"/{self.total}"
+            if self.count:
+                eta = (self.total - self.count) * elapsed / self.count
+                message += f" ETA {timedelta(seconds=int(eta))}"
+        message += f", {self.count / elapsed:.1f} files/s"
+        if self.size:
+            message += f", {sizeof_fmt(self.size / elapsed)}/s"
+        if self.current:
+            message += f", {self.current}"
+        # do not wrap the line
+        message = message[: shutil.get_terminal_size().columns - 1]
+        sys.stdout.write(clear_line() + self.buffer.getvalue())
+        self.buffer = io.StringIO()
+        print_temp_message(message)
+        self.displayed = True
+
+    def print(self, *args, **kwargs):
+        """
+        print a line, buffered until the next refresh
+        """
+        print(*args, **kwargs, file=self.buffer if self.enabled else sys.stdout)
+
+    def close(self):
+        """
+        write buffered lines and remove the progress line
+        """
+        if self.displayed:
+            sys.stdout.write(clear_line())
+            self.displayed = False
+        sys.stdout.write(self.buffer.getvalue())
+        self.buffer = io.StringIO()
+        sys.stdout.flush()
+
+
 def preload(
     files: Iterable[MultimediaFile],
     func: callable,
     workers: int = 8,
     verbose: bool = True,
+    progress: Progress = None,
+    scheduler: IOScheduler = None,
+    batch_size: int = None,
 ) -> Dict:
     """
-    load metadata in parallel and yield element when done
+    load metadata in parallel and yield element when done,
+    files are read by batches in the order and with the pools of the scheduler,
+    at most two batches are loaded at the same time, by default all files are
+    sorted together unless the scheduler keeps the walk order
     """
+    if progress is None:
+        progress = Progress(enabled=verbose)
+    if scheduler is None:
+        scheduler = IOScheduler()
+    if progress.total is None and hasattr(files, "__len__"):
+        progress.total = len(files)
+    if batch_size is None:
+        batch_size = PRELOAD_BATCH_SIZE if scheduler.order == "walk" else sys.maxsize
 
     def load(item: MultimediaFile):
-        if verbose:
-            print_temp_message(f"Analyze {item.file.name}")
-        return func(item)
-
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        jobs = {executor.submit(load, f): f for f in files}
-        for future in concurrent.futures.as_completed(jobs):
-            item, result = jobs[future], None
-            if verbose:
-                message = f"Analyze {item.file.name}"
-                print(message, Cursor.BACK(len(message)), sep="", end="", flush=True)
-            try:
-                result = future.result()
-            except BaseException:  # pylint: disable=broad-except
-                pass
-            yield item, result
+        with PROFILER.stage("preload"):
+            out = func(item)
+            # stat in the worker thread, the size is displayed in the progress
+            item.stat  # pylint: disable=pointless-statement
+            return out
+
+    jobs = {}
+
+    def wait(count: int):
+        # yield the results until at most count jobs are running
+        while len(jobs) > count:
+            done, _ = concurrent.futures.wait(
+                jobs, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                item, result = jobs.pop(future), None
+                try:
+                    result = future.result()
+                    progress.update(item.file.name, item.size)
+                except BaseException:  # pylint: disable=broad-except
+                    progress.update(item.file.name)
+                yield item, result
+
+    try:
+        with scheduler.executor(workers) as submit:
+            files = iter(files)
+            while True:
+                items = scheduler.sort(
+                    itertools.islice(files, batch_size), attrgetter("file")
+                )
+                if not items:
+                    break
+                task = scheduler.task(items, load, attrgetter("file"))
+                for i, item in enumerate(items):
+                    jobs[submit(item.file, task, i)] = item
+                # read the next batch while the end of this one is loaded
+                yield from wait(batch_size)
+            yield from wait(0)
+    finally:
+        progress.close()
@@ -1,16 +1,135 @@
-import collections
+import collections.abc
+import errno
+import hashlib
+import itertools
+import os
 import re
+import shutil
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures.thread import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from json import loads
+from operator import itemgetter
 from pathlib import Path
+from queue import Queue
 from subprocess import check_output
-from typing import Iterable
+from threading import BoundedSemaphore, Lock, local
+from typing import Dict, Iterable
 
 from colorama import Cursor
 from colorama.ansi import clear_line
 
+from .profiling import PROFILER
 
 DATE_PATTERN = r"^(2[0-9]{3}):([0-9]{2}):([0-9]{2}) "
+# size of the partial fingerprint used to split files with the same size
+PARTIAL_SIZE = 64 * 1024
+# optional cache and exiftool processes, used by the daemon
+FILE_CACHE = None
+EXIFTOOL_POOL = None
+# set in the daemon, its resource usage covers all the commands it ran
+RESIDENT = False
+# token bucket limiting the reads of the current thread, see IOScheduler.task
+IO_LIMIT = local()
+
+
+class FileCache:
+    """
+    cache values computed from files, entries are invalidated when
+    the size, the mtime or the inode of the file change
+    """
+
+    def __init__(self, maxsize: int = 200000):
+        self.maxsize = maxsize
+        self.lock = Lock()
+        self.data = collections.OrderedDict()
+
+    def get(self, file: Path, key: tuple, func: callable):
+        """
+        get the cached value or compute it
+        """
+        stat = file.stat()
+        signature = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        key = (str(file.resolve()), *key)
+        with self.lock:
+            hit = self.data.get(key)
+            if hit is not None and hit[0] == signature:
+                self.data.move_to_end(key)
+                PROFILER.count("file cache hits")
+                return hit[1]
+        value = func()
+        with self.lock:
+            self.data[key] = (signature, value)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+        return value
+
+
+def cached(file: Path, key: tuple, func: callable):
+    """
+    use the file cache if enabled
+    """
+    if FILE_CACHE is None:
+        return func()
+    return FILE_CACHE.get(file, key, func)
+
+
+class ExifToolPool:
+    """
+    exiftool processes running in -stay_open mode to avoid
+    starting a new perl interpreter for each file
+    """
+
+    def __init__(self, size: int = 4):
+        self.size = size
+        self.lock = Lock()
+        self.processes = []
+        self.idle = Queue()
+
+    def execute(self, args: list) -> bytes:
+        """
+        run exiftool with the given arguments and return its output
+        """
+        with self.lock:
+            if self.idle.empty() and len(self.processes) < self.size:
+                process = subprocess.Popen(
+                    ["exiftool", "-stay_open", "True", "-@", "-"],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                )
+                self.processes.append(process)
+                self.idle.put(process)
+        process = self.idle.get()
+        try:
+            process.stdin.write("".join(f"{a}\n" for a in args).encode())
+            process.stdin.write(b"-execute\n")
+            process.stdin.flush()
+            out = b""
+            while not out.endswith(b"{ready}\n"):
+                line = process.stdout.readline()
+                if not line:
+                    raise IOError("exiftool process exited")
+                out += line
+            return out[: -len(b"{ready}\n")]
+        finally:
+            self.idle.put(process)
+
+    def close(self):
+        """
+        stop all exiftool processes
+        """
+        for process in self.processes:
+            process.stdin.write(b"-stay_open\nFalse\n")
+            process.stdin.close()
+            process.wait()
+        self.processes.clear()
 
 
 def sizeof_fmt(num: float, suffix="B"):
@@ -24,6 +143,22 @@ def sizeof_fmt(num: float, suffix="B"):
     raise ValueError()
 
 
+def peak_memory():
+    """
+    peak resident memory of the process in bytes, None if unknown or
+    in the daemon
+    """
+    if RESIDENT:
+        return None
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    out = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return out if sys.platform == "darwin" else out * 1024
+
+
 def filter_relevant_exif(key: str):
     """
     filter non relevant exif keys for comparison
@@ -43,29 +178,379 @@ def filter_relevant_exif(key: str):
     )
 
 
-def compute_fingerprint(file: Path, func=callable):
+class TreeHash:
     """
-    compute fingerprint given the algo function (sha1, md5 ...)
+    BLAKE2b in tree mode: fixed size chunks are hashed as leaves, in parallel
+    for files, and their digests are hashed by the root node.
+    Can also be used sequentially like hashlib functions.
     """
-    file = file.resolve()
-    algo = func()
-    with file.open("rb") as fp:
-        for chunk in iter(lambda: fp.read(4096), b""):
+
+    name = "b2tree"
+    CHUNK_SIZE = 16 * 1024 * 1024
+    READ_SIZE = 1024 * 1024
+    EXECUTOR = None
+    LOCK = Lock()
+
+    def __init__(self):
+        self.digests = []
+        self.leaf, self.leaf_size = self.node(0), 0
+
+    @classmethod
+    def node(cls, offset: int = 0, depth: int = 0):
+        """
+        leaf (depth 0) or root (depth 1) node
+        """
+        return hashlib.blake2b(
+            digest_size=32,
+            fanout=0,
+            depth=2,
+            leaf_size=cls.CHUNK_SIZE,
+            node_offset=offset,
+            node_depth=depth,
+            inner_size=32,
+            last_node=depth == 1,
+        )
+
+    @classmethod
+    def root(cls, digests: list):
+        out = cls.node(depth=1)
+        out.update(b"".join(digests))
+        return out.hexdigest()
+
+    @classmethod
+    def executor(cls):
+        """
+        threads shared by all files, leaves are small independant tasks
+        """
+        with cls.LOCK:
+            if cls.EXECUTOR is None:
+                cls.EXECUTOR = ThreadPoolExecutor(
+                    max_workers=os.cpu_count() or 4, thread_name_prefix="b2tree"
+                )
+            return cls.EXECUTOR
+
+    def update(self, data: bytes):
+        view = memoryview(data)
+        while len(view) > 0:
+            size = min(len(view), self.CHUNK_SIZE - self.leaf_size)
+            self.leaf.update(view[:size])
+            self.leaf_size += size
+            view = view[size:]
+            if self.leaf_size == self.CHUNK_SIZE:
+                self.digests.append(self.leaf.digest())
+                self.leaf, self.leaf_size = self.node(len(self.digests)), 0
+
+    def hexdigest(self):
+        digests = list(self.digests)
+        if self.leaf_size > 0 or len(digests) == 0:
+            digests.append(self.leaf.digest())
+        return self.root(digests)
+
+    @classmethod
+    def hash_file(cls, file: Path, limit: int = None, bucket: "TokenBucket" = None):
+        """
+        hash the chunks of the file in parallel with positional reads,
+        the reads of all chunks take their size from the bucket
+        """
+        fd = os.open(file, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            if limit is not None:
+                size = min(size, limit)
+
+            def leaf(index: int):
+                out = cls.node(index)
+                start = index * cls.CHUNK_SIZE
+                end = min(start + cls.CHUNK_SIZE, size)
+                while start < end:
+                    data = os.pread(fd, min(cls.READ_SIZE, end - start), start)
+                    if not data:
+                        break
+                    if bucket is not None:
+                        bucket.consume(len(data))
+                    out.update(data)
+                    start += len(data)
+                return out.digest()
+
+            count = max(1, -(-size // cls.CHUNK_SIZE))
+            if count == 1:
+                digests = [leaf(0)]
+            else:
+                digests = list(cls.executor().map(leaf, range(count)))
+            PROFILER.count("bytes hashed", size)
+            return cls.root(digests)
+        finally:
+            os.close(fd)
+
+
+# FS_IOC_FIEMAP ioctl of linux, its header and the first extent
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_HEADER = struct.Struct("=QQLLLL")
+FIEMAP_EXTENT = struct.Struct("=QQQ2Q4L")
+
+
+def physical_offset(file: Path):
+    """
+    offset of the first extent of the file on its device, None if the
+    filesystem does not support FIEMAP or the file is empty
+    """
+    try:
+        import fcntl  # pylint: disable=import-outside-toplevel
+
+        buffer = bytearray(
+            FIEMAP_HEADER.pack(0, 2 ** 64 - 1, 0, 0, 1, 0) + bytes(FIEMAP_EXTENT.size)
+        )
+        with open(file, "rb") as fp:
+            fcntl.ioctl(fp.fileno(), FS_IOC_FIEMAP, buffer)
+    except (ImportError, OSError):
+        return None
+    if FIEMAP_HEADER.unpack_from(buffer)[3] == 0:
+        return None
+    return FIEMAP_EXTENT.unpack_from(buffer, FIEMAP_HEADER.size)[1]
+
+
+def advise_willneed(file: Path):
+    """
+    ask the kernel to read the file in the page cache in background
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(file, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+class TokenBucket:
+    """
+    limit the throughput shared by several threads, a consumer waits until
+    the tokens it took are refilled
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens, self.last = self.capacity, time.monotonic()
+        self.lock = Lock()
+
+    def consume(self, amount: float):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.last) * self.rate
+            )
+            self.last = now
+            # tokens can be borrowed, the next consumers wait for the debt too
+            self.tokens -= amount
+            wait = -self.tokens / self.rate
+        if wait > 0:
+            with PROFILER.stage("io limit"):
+                time.sleep(wait)
+
+
+class IOScheduler:
+    """
+    order file reads by device then inode or physical offset to reduce seeks
+    on rotating disks, limit concurrent readers per device, prefetch the
+    next files and optionally run the tasks of each device in its own pool
+    """
+
+    ORDERS = ("walk", "inode", "physical")
+
+    def __init__(
+        self,
+        order: str = "walk",
+        readers: int = None,
+        readahead: int = 0,
+        device_workers: Dict[int, int] = None,
+        io_limit: float = None,
+    ):
+        if order not in self.ORDERS:
+            raise ValueError(f"Invalid io order: {order}")
+        self.order, self.readers, self.readahead = order, readers, readahead
+        # bytes per second read by all workers
+        self.bucket = TokenBucket(io_limit) if io_limit else None
+        # workers of the pool of each device, the None key is the default size,
+        # all devices share a pool if not set
+        self.device_workers = device_workers
+        self.semaphores = {}
+        # device of the parent folder of the files
+        self.devices = {}
+        self.lock = Lock()
+
+    def device(self, path: Path):
+        """
+        device of the file, only the parent folder is checked
+        """
+        folder = os.path.dirname(path)
+        with self.lock:
+            if folder in self.devices:
+                return self.devices[folder]
+        try:
+            out = os.stat(folder or ".").st_dev
+        except OSError:
+            out = None
+        with self.lock:
+            self.devices[folder] = out
+        return out
+
+    @contextmanager
+    def executor(self, workers: int):
+        """
+        yield a submit(path, func, *args) function running the task in the
+        shared pool, or in the pool of the device of the file
+        """
+        pools = {}
+
+        def submit(path: Path, func: callable, *args):
+            device = None if self.device_workers is None else self.device(path)
+            if device not in pools:
+                size = workers
+                if self.device_workers is not None:
+                    size = self.device_workers.get(
+                        device, self.device_workers.get(None, workers)
+                    )
+                pools[device] = ThreadPoolExecutor(
+                    max_workers=size, thread_name_prefix=f"io-{device}"
+                )
+            return pools[device].submit(func, *args)
+
+        try:
+            yield submit
+        finally:
+            for pool in pools.values():
+                pool.shutdown()
+
+    def sort_key(self, path: Path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            # read last, the error is reported when the file is processed
+            return (float("inf"),)
+        offset = physical_offset(path) if self.order == "physical" else None
+        # files without physical offset are read in inode order after the others
+        return (st.st_dev, offset is None, offset or 0, st.st_ino)
+
+    def sort(self, items: Iterable, path: callable = None) -> list:
+        """
+        items in reading order, path gives the file of an item
+        """
+        items = list(items)
+        if self.order == "walk":
+            return items
+        with PROFILER.stage("io order"):
+            keys = [self.sort_key(path(i) if path else i) for i in items]
+            order = sorted(range(len(items)), key=keys.__getitem__)
+        return [items[i] for i in order]
+
+    def semaphore(self, path: Path):
+        device = self.device(path)
+        with self.lock:
+            if device not in self.semaphores:
+                self.semaphores[device] = BoundedSemaphore(self.readers)
+            return self.semaphores[device]
+
+    def task(self, items: list, func: callable, path: callable = None):
+        """
+        wrap the function to be called with the index of an item of the
+        sorted items, with the readers and io limits and readahead of the
+        next items
+        """
+        paths = [path(i) for i in items] if path else items
+        for file in paths[: self.readahead]:
+            advise_willneed(file)
+
+        def out(index: int):
+            if self.readahead and index + self.readahead < len(paths):
+                advise_willneed(paths[index + self.readahead])
+            # the reads of hash_file are throttled by chunks
+            IO_LIMIT.bucket = self.bucket
+            try:
+                if self.readers is None:
+                    return func(items[index])
+                with self.semaphore(paths[index]):
+                    return func(items[index])
+            finally:
+                IO_LIMIT.bucket = None
+
+        return out
+
+
+def hash_file(file: Path, func: callable, limit: int = None):
+    """
+    hash the file without cache given the algo function (sha1, md5 ...),
+    optionally only the first bytes of the file, reads are throttled
+    in the tasks of an IOScheduler with an io limit
+    """
+    bucket = getattr(IO_LIMIT, "bucket", None)
+    if func is TreeHash:
+        with PROFILER.stage("hash"):
+            return TreeHash.hash_file(file, limit, bucket)
+    algo, size = func(), 0
+    with PROFILER.stage("hash"), file.open("rb") as fp:
+        while limit is None or size < limit:
+            chunk = fp.read(4096 if limit is None else min(4096, limit - size))
+            if not chunk:
+                break
+            if bucket is not None:
+                bucket.consume(len(chunk))
             algo.update(chunk)
+            size += len(chunk)
+    PROFILER.count("bytes hashed", size)
     return algo.hexdigest()
 
 
-def read_metadata(file: Path):
+def compute_fingerprint(file: Path, func=callable, limit: int = None):
     """
-    read metada from the file using exiftool
+    compute fingerprint given the algo function (sha1, md5 ...),
+    optionally only of the first bytes of the file
+    """
+    file = file.resolve()
+    return cached(
+        file,
+        ("fingerprint", fingerprint_name(func), limit),
+        lambda: hash_file(file, func, limit),
+    )
+
+
+def fingerprint_name(func: callable):
+    """
+    name of the fingerprint algo (md5, sha1 ...)
+    """
+    return func().name
+
+
+def read_metadata(file: Path, tags: Iterable[str] = None, fast: int = 0):
+    """
+    read metada from the file using exiftool,
+    optionally only the given tags and with -fast/-fast2 ... modes
     """
     if not file.exists():
         raise IOError(f"Cannot find {file}")
-    payload = check_output(["exiftool", "-G", "-j", str(file)])
-    payload = loads(payload)
-    assert isinstance(payload, list)
-    assert len(payload) == 1
-    return payload[0]
+    command = ["exiftool", "-G", "-j"]
+    if fast:
+        command.append("-fast" if fast == 1 else f"-fast{fast}")
+    if tags is not None:
+        command += [f"-{tag}" for tag in tags]
+    command.append(str(file))
+
+    def read():
+        PROFILER.count("exiftool calls")
+        with PROFILER.stage("exiftool"):
+            if EXIFTOOL_POOL is not None:
+                payload = EXIFTOOL_POOL.execute(command[1:])
+            else:
+                payload = check_output(command)
+        payload = loads(payload)
+        assert isinstance(payload, list)
+        assert len(payload) == 1
+        return payload[0]
+
+    return cached(file, ("metadata", *command[1:-1]), read)
 
 
 def auto_datetime(text: str):
@@ -91,7 +576,7 @@ def visit(
     """
     recursice folder visitor
     """
-    if isinstance(item, collections.Iterable):
+    if isinstance(item, collections.abc.Iterable):
         # test if iterable
         for subfolder in item:
             yield from visit(
@@ -106,10 +591,13 @@ def visit(
             if (yield_dir or not item.is_dir()) and (
                 filter_fnc is None or filter_fnc(item)
             ):
+                PROFILER.count("files visited")
                 yield item
         if item.is_dir():
             # yield children in case of folder
-            for child in item.iterdir():
+            with PROFILER.stage("walk"):
+                children = list(item.iterdir())
+            for child in children:
                 yield from visit(
                     child,
                     recursive=recursive,
@@ -118,6 +606,20 @@ def visit(
                 )
 
 
+def move_file(source: Path, dest: Path) -> Path:
+    """
+    rename the file, or copy and delete it if the destination is on another
+    filesystem, return the destination
+    """
+    try:
+        os.rename(source, dest)
+        return dest
+    except OSError as e:  # pylint: disable=invalid-name
+        if e.errno != errno.EXDEV:
+            raise
+        return Path(shutil.move(source, dest))
+
+
 def print_temp_message(msg: str):
     """
     print a message and reset the cursor to the begining of the line
@@ -138,4 +640,39 @@ def iter_to_map(items: Iterable, key_fnc: callable, value_fnc: callable = None):
         if key not in out:
             out[key] = []
         out[key].append(value_fnc(item) if value_fnc else item)
-    return out
\ No newline at end of file
+    return out
+
+
+def iter_to_groups_on_disk(
+    items: Iterable, key_fnc: callable, value_fnc: callable = None, folder=None
+):
+    """
+    same as iter_to_map but items are spilled to a temporary sqlite database
+    and sorted on disk, yield (key, values) in key order
+    """
+
+    def rows():
+        for item in items:
+            key = key_fnc(item)
+            # skip null keys
+            if key is not None:
+                yield key, value_fnc(item) if value_fnc else item
+
+    with tempfile.TemporaryDirectory(prefix="pmt-", dir=folder) as tmp:
+        db = sqlite3.connect(str(Path(tmp) / "groups.db"))
+        try:
+            db.executescript(
+                """
+                PRAGMA journal_mode = OFF;
+                PRAGMA synchronous = OFF;
+                PRAGMA temp_store = FILE;
+                CREATE TABLE items (key NOT NULL, value NOT NULL);
+                """
+            )
+            db.executemany("INSERT INTO items VALUES (?, ?)", rows())
+            db.commit()
+            cursor = db.execute("SELECT key, value FROM items ORDER BY key")
+            for key, group in itertools.groupby(cursor, itemgetter(0)):
+                yield key, [value for _, value in group]
+        finally:
+            db.close()
@@ -0,0 +1,7 @@
+from photomatools.cli import default_argument_paser
+
+
+def parse_args(tool, *argv: str):
+    parser = default_argument_paser(tool.name)
+    tool.configure_parser(parser)
+    return parser.parse_args(["-q", *argv])
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from photomatools.borg import BorgArchive, BorgExtraction, BorgRepository
+
+FILES = {f"photos/IMG_{i}.jpg": f"content of photo {i}".encode() for i in range(5)}
+
+FAKE_BORG = """#!{python}
+import json, os, sys
+from pathlib import Path
+FILES = {files}
+args = sys.argv[1:]
+if args[0] == "list":
+    for path, content in FILES.items():
+        print(json.dumps({{"path": path, "size": len(content), "type": "-"}}))
+elif args[0] == "extract":
+    patterns = Path(args[args.index("--patterns-from") + 1]).read_text()
+    paths = [l[5:] for l in patterns.splitlines() if l.startswith("+ pp:")]
+    if os.getenv("FAKE_BORG_FAIL") in paths:
+        sys.exit(2)
+    for path in FILES:
+        if path in paths:
+            if "--stdout" in args:
+                sys.stdout.buffer.write(FILES[path].encode())
+            else:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                Path(path).write_bytes(FILES[path].encode())
+"""
+
+
+class TestBorg(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+        borg_bin = self.folder / "borg"
+        borg_bin.write_text(
+            FAKE_BORG.format(
+                python=sys.executable,
+                files=repr({k: v.decode() for k, v in FILES.items()}),
+            )
+        )
+        borg_bin.chmod(0o755)
+        patcher = mock.patch.dict(os.environ, {"BORG_BIN": str(borg_bin)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+        self.archive = BorgArchive(
+            BorgRepository(self.folder / "repo"),
+            {"id": "0123456789abcdef" * 4, "name": "test", "time": "2021-01-01"},
+        )
+
+    def test_fingerprints(self):
+        files = list(reversed(self.archive.files[1:4]))
+        result = list(self.archive.iter_fingerprints(files))
+        self.assertEqual(len(result), 3)
+        for bfile, fingerprint in result:
+            self.assertEqual(fingerprint, hashlib.md5(FILES[bfile.path]).hexdigest())
+
+    def test_resume(self):
+        output = self.folder / "output"
+        output.mkdir()
+        extraction = BorgExtraction(self.archive, output, chunk_size=2, workers=2)
+        chunks = extraction.chunks(self.archive.files)
+        self.assertEqual([len(c) for c in chunks], [2, 2, 1])
+        with mock.patch.dict(os.environ, {"FAKE_BORG_FAIL": "photos/IMG_4.jpg"}):
+            with self.assertRaises(subprocess.CalledProcessError):
+                list(extraction.run(chunks))
+        self.assertEqual(len(extraction.extracted_paths()), 4)
+        self.assertTrue(extraction.journal.exists())
+        # rerun only extracts the missing chunk
+        chunks = extraction.chunks(self.archive.files)
+        self.assertEqual([[f.path for f in c] for c in chunks], [["photos/IMG_4.jpg"]])
+        list(extraction.run(chunks))
+        # nothing is left in the output folder but the files
+        self.assertFalse(extraction.journal.exists())
+        self.assertEqual(
+            sorted(
+                str(f.relative_to(output)) for f in output.rglob("*") if f.is_file()
+            ),
+            sorted(FILES),
+        )
+        for path, content in FILES.items():
+            self.assertEqual((output / path).read_bytes(), content)
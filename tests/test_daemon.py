@@ -0,0 +1,42 @@
+import io
+import multiprocessing
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from photomatools.daemon import DaemonServer, forward, forwarded_env, stop
+
+
+class TestDaemon(unittest.TestCase):
+    def test_forward(self):
+        def handler(argv):
+            print("cwd", os.getcwd(), *argv)
+            return len(argv)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "pmt.sock"
+            self.assertIsNone(forward(["foo"], path))
+            server = DaemonServer(path, handler)
+            # sys.stdout is redirected by the server, run it in another process
+            process = multiprocessing.get_context("fork").Process(target=server.serve)
+            process.start()
+            server.socket.close()
+            try:
+                # a running daemon is not replaced
+                with self.assertRaises(ValueError):
+                    DaemonServer(path, handler)
+                self.assertEqual(path.stat().st_mode & 0o777, 0o600)
+                out = io.StringIO()
+                with redirect_stdout(out):
+                    self.assertEqual(forward(["foo", "bar"], path), 2)
+                self.assertEqual(out.getvalue(), f"cwd {os.getcwd()} foo bar\n")
+            finally:
+                stop(path)
+                process.join()
+            self.assertFalse(path.exists())
+
+    def test_forwarded_env(self):
+        env = {"HOME": "/home/foo", "LC_ALL": "C", "SSH_AUTH_SOCK": "/tmp/agent"}
+        self.assertEqual(forwarded_env(env), {"HOME": "/home/foo", "LC_ALL": "C"})
@@ -0,0 +1,26 @@
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+from photomatools.cli.dedup import Dedup
+
+from .conftest import parse_args
+
+
+class TestDedup(unittest.TestCase):
+    def test_out_of_core(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            for name, content in (("a", b"foo"), ("b", b"bar"), ("c", b"foo")):
+                (tmp / name).mkdir()
+                (tmp / name / "file.jpg").write_bytes(content)
+            tool = Dedup()
+            out = StringIO()
+            with redirect_stdout(out):
+                tool.run(parse_args(tool, "--out-of-core", str(tmp)))
+            lines = out.getvalue().splitlines()
+            self.assertEqual(len(lines), 3)
+            self.assertIn(str(tmp / "a"), lines[1])
+            self.assertIn(str(tmp / "c"), lines[2])
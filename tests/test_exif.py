@@ -0,0 +1,102 @@
+import struct
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from photomatools.exif import read_native_metadata
+
+
+def box(kind: bytes, *payload: bytes):
+    data = b"".join(payload)
+    return struct.pack(">I4s", 8 + len(data), kind) + data
+
+
+def tiff(date: str, subsec: str = None):
+    # big endian tiff with IFD0 pointing to the Exif IFD
+    entries = [(0x9003, date.encode() + b"\0")]
+    if subsec:
+        entries.append((0x9291, subsec.encode() + b"\0"))
+    exif_ifd = 8 + 2 + 12 + 4
+    values = exif_ifd + 2 + 12 * len(entries) + 4
+    out = b"MM\0\x2a" + struct.pack(">I", 8)
+    out += struct.pack(">HHHII", 1, 0x8769, 4, 1, exif_ifd) + b"\0" * 4
+    out += struct.pack(">H", len(entries))
+    blob = b""
+    for tag, value in entries:
+        if len(value) > 4:
+            out += struct.pack(">HHII", tag, 2, len(value), values + len(blob))
+            blob += value
+        else:
+            out += struct.pack(">HHI", tag, 2, len(value)) + value.ljust(4, b"\0")
+    return out + b"\0" * 4 + blob
+
+
+def jpeg(date: str, subsec: str = None):
+    app1 = b"Exif\0\0" + tiff(date, subsec)
+    return b"\xff\xd8" + b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1
+
+
+def mp4(seconds: int, creationdate: str = None):
+    moov = [box(b"mvhd", struct.pack(">BxxxII", 0, seconds, seconds), b"\0" * 88)]
+    if creationdate:
+        key = b"com.apple.quicktime.creationdate"
+        keys = box(b"keys", struct.pack(">III", 0, 1, len(key) + 8), b"mdta", key)
+        value = box(b"data", struct.pack(">II", 1, 0), creationdate.encode())
+        ilst = box(b"ilst", box(struct.pack(">I", 1), value))
+        moov.append(box(b"meta", box(b"hdlr", b"\0" * 24), keys, ilst))
+    ftyp = box(b"ftyp", b"qt  ", b"\0" * 4, b"qt  ")
+    return ftyp + box(b"mdat", b"\0" * 16) + box(b"moov", *moov)
+
+
+def heic(date: str):
+    exif = struct.pack(">I", 6) + b"Exif\0\0" + tiff(date)
+    ftyp = box(b"ftyp", b"heic", b"\0" * 4, b"mif1", b"heic")
+
+    def meta(offset: int):
+        infe = box(b"infe", struct.pack(">BxxxHH4s", 2, 1, 0, b"Exif"))
+        iinf = box(b"iinf", struct.pack(">BxxxH", 0, 1), infe)
+        iloc = box(
+            b"iloc",
+            struct.pack(">BxxxBBHHHHII", 0, 0x44, 0, 1, 1, 0, 1, offset, len(exif)),
+        )
+        return box(b"meta", b"\0" * 4, box(b"hdlr", b"\0" * 24), iinf, iloc)
+
+    header = ftyp + meta(0)
+    header = ftyp + meta(len(header) + 8)
+    return header + box(b"mdat", exif)
+
+
+class TestExif(unittest.TestCase):
+    def read(self, content: bytes):
+        with tempfile.NamedTemporaryFile() as fp:
+            fp.write(content)
+            fp.flush()
+            return read_native_metadata(Path(fp.name))
+
+    def test_jpeg(self):
+        out = self.read(jpeg("2020:02:24 17:05:01", "123"))
+        self.assertEqual(out["File:MIMEType"], "image/jpeg")
+        self.assertEqual(out["EXIF:DateTimeOriginal"], "2020:02:24 17:05:01")
+        self.assertEqual(
+            out["Composite:SubSecDateTimeOriginal"], "2020:02:24 17:05:01.123"
+        )
+        self.assertIsNone(self.read(jpeg("0000:00:00 00:00:00")))
+        self.assertIsNone(self.read(b"\xff\xd8\xff\xda"))
+
+    def test_heic(self):
+        out = self.read(heic("2021:07:14 10:00:00"))
+        self.assertEqual(out["File:FileTypeExtension"], "heic")
+        self.assertEqual(out["EXIF:DateTimeOriginal"], "2021:07:14 10:00:00")
+
+    def test_quicktime(self):
+        seconds = datetime(2020, 2, 24, 16, 5, 1) - datetime(1904, 1, 1)
+        seconds = int(seconds.total_seconds())
+        out = self.read(mp4(seconds, "2020-02-24T17:05:01+0100"))
+        self.assertEqual(out["File:MIMEType"], "video/quicktime")
+        self.assertEqual(out["QuickTime:CreateDate"], "2020:02:24 16:05:01")
+        self.assertEqual(out["QuickTime:CreationDate"], "2020:02:24 17:05:01+01:00")
+        self.assertIsNone(self.read(mp4(0)))
+
+    def test_unknown(self):
+        self.assertIsNone(self.read(b"GIF89a"))
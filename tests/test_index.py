@@ -0,0 +1,108 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from photomatools import index as index_module
+from photomatools.index import FingerprintIndex, iter_index
+
+
+class TestIndex(unittest.TestCase):
+    def test_scan(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            library = tmp / "library"
+            library.mkdir()
+            (library / "a.jpg").write_bytes(b"foo")
+            (library / "b.jpg").write_bytes(b"barbar")
+            with FingerprintIndex(tmp / "index.db") as index:
+                self.assertEqual(index.scan([library]), (2, 0, 0))
+                # nothing changed
+                self.assertEqual(index.scan([library]), (0, 0, 0))
+                self.assertEqual(
+                    index.find(3, "acbd18db4cc2f85cedef654fccc4a4d8"),
+                    [(library / "a.jpg").resolve()],
+                )
+                self.assertEqual(index.find(3, "0" * 32), [])
+                self.assertEqual(index.find(3, roots=[tmp / "other"]), [])
+                (library / "a.jpg").unlink()
+                self.assertEqual(index.scan([library]), (0, 1, 0))
+                self.assertEqual(index.find(3), [])
+
+    def test_unreadable(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            library = tmp / "library"
+            library.mkdir()
+            for name in ("a", "b", "c"):
+                (library / f"{name}.jpg").write_bytes(name.encode())
+            compute_fingerprint = index_module.compute_fingerprint
+
+            def fingerprint(file, *args, **kwargs):
+                if file.name == "b.jpg":
+                    raise PermissionError(f"Permission denied: '{file}'")
+                return compute_fingerprint(file, *args, **kwargs)
+
+            errors = []
+            with FingerprintIndex(tmp / "index.db") as index, mock.patch.object(
+                index_module, "compute_fingerprint", fingerprint
+            ):
+                # the other files are indexed
+                self.assertEqual(
+                    index.scan([library], on_error=lambda *e: errors.append(e)),
+                    (2, 0, 1),
+                )
+            self.assertEqual([file.name for file, _ in errors], ["b.jpg"])
+            self.assertIsInstance(errors[0][1], PermissionError)
+            self.assertEqual(
+                sorted(Path(row[0]).name for row in iter_index(tmp / "index.db")),
+                ["a.jpg", "c.jpg"],
+            )
+
+    def test_shards(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            library = tmp / "library"
+            library.mkdir()
+            for i in range(20):
+                (library / f"{i}.jpg").write_bytes(b"foo" if i % 2 else b"bar")
+            paths = []
+            for i in range(3):
+                with FingerprintIndex(tmp / f"shard{i}.db") as index:
+                    index.scan([library], shard=(i, 3))
+                paths += [row[0] for row in iter_index(tmp / f"shard{i}.db")]
+            self.assertEqual(
+                sorted(paths), sorted(str(f.resolve()) for f in library.iterdir())
+            )
+            # shards scanned in the same index keep the rows of the others
+            with FingerprintIndex(tmp / "all.db") as index:
+                for i in range(3):
+                    self.assertEqual(index.scan([library], shard=(i, 3))[1], 0)
+                self.assertEqual(index.scan([library], shard=(0, 3))[:2], (0, 0))
+            self.assertEqual(
+                sorted(row[0] for row in iter_index(tmp / "all.db")), sorted(paths)
+            )
+
+    def test_schema_version(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file = Path(tmp) / "index.db"
+            with sqlite3.connect(str(file)) as db:
+                db.execute("CREATE TABLE files (path TEXT)")
+                db.execute("INSERT INTO files VALUES ('foo')")
+            (Path(tmp) / "library").mkdir()
+            with FingerprintIndex(file) as index:
+                self.assertEqual(index.scan([Path(tmp) / "library"]), (0, 0, 0))
+                self.assertEqual(index.find(3), [])
+
+    def test_store(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            (tmp / "a.jpg").write_bytes(b"foo")
+            with FingerprintIndex(tmp / "index.db") as index:
+                self.assertIsNone(index.lookup(tmp / "a.jpg", "phash"))
+                index.store(tmp / "a.jpg", "phash", "0123")
+            with FingerprintIndex(tmp / "index.db") as index:
+                self.assertEqual(index.lookup(tmp / "a.jpg", "phash"), "0123")
+                (tmp / "a.jpg").write_bytes(b"barbar")
+                self.assertIsNone(index.lookup(tmp / "a.jpg", "phash"))
@@ -0,0 +1,33 @@
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from photomatools.model import MultimediaFile
+
+
+class TestModel(unittest.TestCase):
+    def test_sort(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+
+            def create(name: str, size: int, date: datetime):
+                (tmp / name).write_bytes(b"x" * size)
+                out = MultimediaFile(tmp / name)
+                out.__dict__["create_date"] = date
+                return out
+
+            date = datetime(2020, 2, 24, 17, 5, 1)
+            files = [
+                create("a.jpg", 1, date),
+                create("b.jpg", 2, date.replace(tzinfo=timezone.utc)),
+                create("c.jpg", 1, date),
+                create("d.jpg", 1, None),
+                create("e.jpg", 1, date - timedelta(seconds=1)),
+            ]
+            self.assertEqual(
+                [f.file.name for f in sorted(files)],
+                ["d.jpg", "e.jpg", "b.jpg", "a.jpg", "c.jpg"],
+            )
+            self.assertLess(files[0], files[2])
+            self.assertLessEqual(files[0], files[0])
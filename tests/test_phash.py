@@ -0,0 +1,57 @@
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from photomatools import phash
+from photomatools.phash import BKTree, hamming
+
+
+class TestPHash(unittest.TestCase):
+    def test_bktree(self):
+        rnd = random.Random(42)
+        values = [rnd.getrandbits(64) for _ in range(500)]
+        # some near duplicates
+        values += [v ^ (1 << rnd.randrange(64)) for v in values[:50]]
+        tree = BKTree()
+        for i, value in enumerate(values):
+            tree.add(value, i)
+        for value in values[:100]:
+            self.assertEqual(
+                sorted(tree.search(value, 4)),
+                sorted(
+                    (i, hamming(value, other))
+                    for i, other in enumerate(values)
+                    if hamming(value, other) <= 4
+                ),
+            )
+        self.assertEqual(list(BKTree().search(0, 64)), [])
+
+    def test_decoder_error(self):
+        # any error of the decoder only skips the file
+        for error in (RuntimeError("decompression bomb"), SyntaxError, IndexError):
+            with mock.patch.object(phash, "phash", side_effect=error):
+                self.assertIsNone(phash.image_hash(Path("a.jpg")))
+
+    @unittest.skipIf(phash.numpy is None, "Pillow and numpy are needed")
+    def test_hashes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            numpy = phash.numpy
+            pixels = numpy.fromfunction(
+                lambda y, x: 127 + 100 * numpy.sin(x / 7) * numpy.cos(y / 5), (64, 96)
+            )
+            image = phash.Image.fromarray(pixels.astype("uint8")).convert("RGB")
+            image.save(tmp / "a.jpg", quality=95)
+            image.resize((48, 32)).save(tmp / "b.jpg", quality=60)
+            phash.Image.new("RGB", (96, 64), "white").save(tmp / "c.jpg")
+            (tmp / "d.jpg").write_bytes(b"not an image")
+            for algo in ("phash", "dhash"):
+                a, b, c = (
+                    int(phash.image_hash(tmp / f"{name}.jpg", algo), 16)
+                    for name in "abc"
+                )
+                self.assertLess(hamming(a, b), 10)
+                self.assertGreater(hamming(a, c), 10)
+                self.assertIsNone(phash.image_hash(tmp / "d.jpg", algo))
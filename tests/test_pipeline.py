@@ -0,0 +1,81 @@
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+
+from photomatools.cli.pipeline import Pipeline
+from photomatools.plan import Plan
+
+from .conftest import parse_args
+from .test_exif import jpeg, mp4
+
+
+class TestPipeline(unittest.TestCase):
+    def run_pipeline(self, *argv: str):
+        tool = Pipeline()
+        out = StringIO()
+        with redirect_stdout(out):
+            ret = tool.run(parse_args(tool, *argv))
+        return ret, out.getvalue().splitlines()
+
+    def create(self, tmp: Path):
+        (tmp / "in" / "sub").mkdir(parents=True)
+        (tmp / "library" / "2019").mkdir(parents=True)
+        (tmp / "in" / "a.jpg").write_bytes(jpeg("2020:02:24 17:05:01"))
+        (tmp / "in" / "sub" / "b.jpg").write_bytes(jpeg("2020:02:24 17:05:01"))
+        (tmp / "in" / "c.jpg").write_bytes(jpeg("2019:08:01 12:00:00"))
+        seconds = datetime(2021, 7, 14, 10, 0, 0) - datetime(1904, 1, 1)
+        (tmp / "in" / "d.mp4").write_bytes(mp4(int(seconds.total_seconds())))
+
+    def library(self, tmp: Path):
+        return sorted(
+            str(f.relative_to(tmp / "library"))
+            for f in (tmp / "library").rglob("*")
+            if f.is_file()
+        )
+
+    def test_pipeline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            self.create(tmp)
+            ret, lines = self.run_pipeline(
+                "-f", "%Y-%m-%d", "-o", str(tmp / "library"), str(tmp / "in")
+            )
+            self.assertEqual(ret, 0)
+            # the copy is skipped, files go in the existing or a new year folder
+            self.assertTrue(any("duplicate of" in line for line in lines))
+            self.assertEqual(
+                self.library(tmp),
+                [
+                    "2019/2019-08-01_001.jpg",
+                    "2020/2020-02-24_001.jpg",
+                    "2021/2021-07-14_001.mov",
+                ],
+            )
+            self.assertEqual(
+                [f.name for f in (tmp / "in").rglob("*") if f.is_file()], ["b.jpg"]
+            )
+
+    def test_dryrun_and_plan(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            self.create(tmp)
+            argv = ("-o", str(tmp / "library"), str(tmp / "in"))
+            ret, lines = self.run_pipeline("-n", *argv)
+            self.assertEqual(ret, 0)
+            self.assertEqual(sum("(dryrun)" in line for line in lines), 3)
+            self.assertEqual(self.library(tmp), [])
+
+            plan = tmp / "plan.jsonl"
+            ret, lines = self.run_pipeline("--plan-out", str(plan), *argv)
+            self.assertEqual(lines[-1], f"Save 3 operation(s) to {plan}")
+            self.assertEqual(self.library(tmp), [])
+            self.assertEqual(
+                sorted(o.source.name for o in Plan.load(plan)),
+                ["a.jpg", "c.jpg", "d.mp4"],
+            )
+            ret, lines = self.run_pipeline("--plan-in", str(plan), *argv)
+            self.assertEqual(ret, 0)
+            self.assertEqual(len(self.library(tmp)), 3)
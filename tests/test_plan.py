@@ -0,0 +1,64 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from photomatools.plan import Journal, Operation, Plan
+
+
+class TestPlan(unittest.TestCase):
+    def test_plan(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            (tmp / "a.jpg").write_bytes(b"foo")
+            (tmp / "b.jpg").write_bytes(b"bar")
+            plan = Plan()
+            plan.append(Operation.create("move", tmp / "a.jpg", tmp / "out" / "a.jpg"))
+            plan.append(Operation.create("copy", tmp / "b.jpg", tmp / "c.jpg"))
+            plan.save(tmp / "plan.jsonl")
+            operations = list(Plan.load(tmp / "plan.jsonl"))
+            self.assertEqual(operations, plan.operations)
+            # sources must not change after the plan
+            (tmp / "b.jpg").write_bytes(b"barbar")
+            operations[0].execute()
+            with self.assertRaises(ValueError):
+                operations[1].execute()
+            self.assertEqual((tmp / "out" / "a.jpg").read_bytes(), b"foo")
+            self.assertFalse((tmp / "c.jpg").exists())
+
+    def test_journal(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            operations = []
+            for name in ("a", "b", "c"):
+                (tmp / f"{name}.jpg").write_bytes(name.encode())
+                operations.append(
+                    Operation.create("move", tmp / f"{name}.jpg", tmp / f"{name}2.jpg")
+                )
+            # the run is interrupted after moving the second file
+            with Journal(tmp / "journal") as journal:
+                journal.execute(operations[0])
+                journal.write(operations[1], "start")
+                operations[1].execute()
+            with (tmp / "journal").open("a") as out:
+                out.write('{"action": "mo')
+
+            with Journal(tmp / "journal") as journal:
+                self.assertEqual(
+                    [journal.execute(o) for o in operations], [False, False, True]
+                )
+            self.assertEqual(
+                sorted(f.name for f in tmp.glob("*.jpg")),
+                ["a2.jpg", "b2.jpg", "c2.jpg"],
+            )
+
+            with Journal(tmp / "journal") as journal:
+                self.assertEqual(list(journal.done()), operations[::-1])
+                for operation in journal.done():
+                    journal.undo(operation)
+                self.assertEqual(list(journal.done()), [])
+            self.assertEqual(
+                sorted(f.name for f in tmp.glob("*.jpg")), ["a.jpg", "b.jpg", "c.jpg"]
+            )
+            lines = (tmp / "journal").read_text().splitlines()
+            self.assertEqual(json.loads(lines[-1])["state"], "undone")
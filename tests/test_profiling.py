@@ -0,0 +1,64 @@
+import json
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stderr
+from io import StringIO
+from pathlib import Path
+
+from photomatools.profiling import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    def test_disabled(self):
+        profiler = Profiler()
+        with profiler.stage("read"):
+            profiler.count("files")
+        self.assertEqual(dict(profiler.stages), {})
+        self.assertEqual(dict(profiler.counters), {})
+
+    def test_summary(self):
+        profiler = Profiler()
+        profiler.enable()
+
+        def work():
+            for _ in range(5):
+                with profiler.stage("read"):
+                    profiler.count("files")
+                profiler.count("bytes", 10)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with profiler.stage("sort"):
+            pass
+        err = StringIO()
+        with redirect_stderr(err):
+            profiler.stop()
+        self.assertFalse(profiler.enabled)
+        self.assertEqual(profiler.stages["read"][0], 20)
+        self.assertEqual(profiler.stages["sort"][0], 1)
+        self.assertEqual(dict(profiler.counters), {"files": 20, "bytes": 200})
+        lines = err.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("Profile: wall"))
+        self.assertEqual(lines[-2].split(), ["bytes", "200"])
+        self.assertEqual(lines[-1].split(), ["files", "20"])
+        self.assertTrue(any(line.split()[:2] == ["read", "20"] for line in lines))
+
+    def test_trace(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            trace = Path(tmp) / "trace.json"
+            profiler = Profiler()
+            profiler.enable(trace=True)
+            with profiler.stage("read"):
+                pass
+            profiler.stop(summary=False, trace=trace)
+            events = json.loads(trace.read_text())["traceEvents"]
+        self.assertEqual(
+            [(e["name"], e["ph"]) for e in events],
+            [("thread_name", "M"), ("read", "X")],
+        )
+        self.assertEqual(events[0]["args"]["name"], threading.current_thread().name)
+        self.assertEqual(events[0]["tid"], events[1]["tid"])
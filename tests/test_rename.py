@@ -0,0 +1,135 @@
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+from photomatools.cli.rename import Rename
+
+from .conftest import parse_args
+from .test_exif import jpeg
+
+
+class TestRename(unittest.TestCase):
+    def run_rename(self, *argv: str):
+        tool = Rename()
+        with redirect_stdout(StringIO()):
+            return tool.run(parse_args(tool, "-f", "%Y-%m-%d", *argv))
+
+    def create(self, folder: Path, dates: dict):
+        folder.mkdir(parents=True, exist_ok=True)
+        for name, date in dates.items():
+            (folder / name).write_bytes(jpeg(date) + name.encode())
+
+    def test_events(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            self.create(
+                tmp / "in",
+                {
+                    "a.jpg": "2020:02:24 17:05:01",
+                    "b.jpg": "2020:02:24 17:05:03",
+                    "c.jpg": "2020:02:25 09:00:00",
+                    "d.jpg": "2021:07:14 10:00:00",
+                },
+            )
+            self.create(tmp / "out", {"2020-02-24_001.jpg": "2020:02:24 12:00:00"})
+            # events are executed in parallel, each keeps its own numbering
+            ret = self.run_rename("-j", "4", "-o", str(tmp / "out"), str(tmp / "in"))
+            self.assertEqual(ret, 0)
+            self.assertEqual(list((tmp / "in").iterdir()), [])
+            self.assertEqual(
+                sorted(f.name for f in (tmp / "out").iterdir()),
+                [
+                    "2020-02-24_001.jpg",
+                    "2020-02-24_002.jpg",
+                    "2020-02-24_003.jpg",
+                    "2020-02-25_001.jpg",
+                    "2021-07-14_001.jpg",
+                ],
+            )
+            self.assertTrue(
+                (tmp / "out" / "2020-02-24_002.jpg").read_bytes().endswith(b"a.jpg")
+            )
+
+    def test_dryrun(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            self.create(
+                tmp / "in",
+                {"a.jpg": "2020:02:24 17:05:01", "b.jpg": "2020:02:24 17:05:03"},
+            )
+            tool = Rename()
+            argv = ("-n", "-f", "%Y-%m-%d", "-o", str(tmp / "out"), str(tmp / "in"))
+            out = StringIO()
+            with redirect_stdout(out):
+                self.assertEqual(tool.run(parse_args(tool, *argv)), 0)
+            # names given to files not moved yet are not given again
+            lines = out.getvalue().splitlines()
+            self.assertEqual(len(lines), 2)
+            self.assertIn("2020-02-24_001.jpg", lines[0])
+            self.assertIn("2020-02-24_002.jpg", lines[1])
+            self.assertFalse((tmp / "out").exists())
+            self.assertEqual(len(list((tmp / "in").iterdir())), 2)
+
+    def test_missing_output(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            dates = {f"{i}.jpg": f"20{10 + i}:01:01 00:00:00" for i in range(8)}
+            self.create(tmp / "in", dates)
+            ret = self.run_rename(
+                "-j", "8", "-o", str(tmp / "a" / "b"), str(tmp / "in")
+            )
+            self.assertEqual(ret, 0)
+            self.assertEqual(len(list((tmp / "a" / "b").iterdir())), 8)
+
+    def test_is_named(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            tool = Rename()
+
+            def is_named(name: str, *argv: str, folder: Path = tmp / "out"):
+                args = parse_args(tool, "-o", str(tmp / "out"), *argv)
+                return tool.is_named(folder / name, args)
+
+            self.assertTrue(is_named("2020-02-24_17h05m01s_001.jpg"))
+            self.assertTrue(is_named("2020-02-24_17h05m01s_012"))
+            self.assertFalse(is_named("2020-02-24_17h05m01s_001.jpg", folder=tmp))
+            self.assertFalse(is_named("2020-02-24_17h05m01s_01.jpg"))
+            self.assertFalse(is_named("2020-02-24_17h05m01s.jpg"))
+            # the label must parse with the format
+            self.assertFalse(is_named("2020-02-24_001.jpg"))
+            self.assertFalse(is_named("IMG_001.jpg"))
+            self.assertTrue(is_named("2020-02-24_001.jpg", "-f", "%Y-%m-%d"))
+            self.assertTrue(is_named("20200224-1705_002.mp4", "-f", "%Y%m%d-%H%M"))
+            self.assertFalse(is_named("2020-02-24_001.jpg", "-f", "%Y%m%d-%H%M"))
+
+    def test_trust_names(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            self.create(
+                tmp / "out",
+                {
+                    "2020-02-24_001.jpg": "2020:02:24 17:05:01",
+                    "2020-02-24_002.jpg": "2020:02:24 17:05:02",
+                    "2020-02-24_003.jpg": "2020:02:24 17:05:03",
+                },
+            )
+            self.create(tmp / "in", {"a.jpg": "2020:02:24 18:00:00"})
+            tool = Rename()
+            out = StringIO()
+            with redirect_stdout(out):
+                args = parse_args(
+                    tool,
+                    *("-n", "-f", "%Y-%m-%d", "-o", str(tmp / "out")),
+                    *("--trust-names", "--verify", "1"),
+                    # the output folder is also an input, written differently
+                    *(str(tmp / "in"), str(tmp / "in" / ".." / "out")),
+                )
+                self.assertEqual(tool.run(args), 0)
+            lines = out.getvalue().splitlines()
+            self.assertEqual(lines[0], "Skip 2 file(s) already named")
+            # the sample to verify is read again and keeps its name
+            self.assertEqual(sum("already named" in line for line in lines[1:]), 1)
+            self.assertEqual(sum(line.startswith("Rename") for line in lines), 1)
+            self.assertIn("2020-02-24_004.jpg", lines[-1])
@@ -0,0 +1,48 @@
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+
+from photomatools import table
+from photomatools.table import MISSING, FileTable, PathStore, hash_prefix, timestamp
+
+
+class TestTable(unittest.TestCase):
+    def test_path_store(self):
+        store = PathStore()
+        paths = [Path("/foo/bar.jpg"), Path("relative/été.mp4"), Path("x")]
+        for path in paths:
+            store.append(path)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store[1], paths[1])
+        self.assertEqual(list(store), paths)
+
+    def test_values(self):
+        date = datetime(2020, 2, 24, 17, 5, 1, 123)
+        self.assertEqual(timestamp(date), timestamp(date.replace(tzinfo=timezone.utc)))
+        self.assertEqual(timestamp(datetime(1970, 1, 1, 0, 1)), 60)
+        self.assertEqual(hash_prefix("00" * 8), 0)
+        self.assertEqual(hash_prefix("ff" * 16), -1)
+
+    def test_group_indices(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            for name, size in (("a", 2), ("b", 1), ("c", 2), ("d", 3), ("e", 1)):
+                (tmp / name).write_bytes(b"x" * size)
+            (tmp / "folder").mkdir()
+            files = FileTable.scan(sorted(tmp.iterdir()))
+            self.assertEqual(len(files), 5)
+            self.assertEqual(files.columns["date"][0], MISSING)
+            # also test the fallback without numpy
+            self.addCleanup(setattr, table, "numpy", table.numpy)
+            for numpy in {None, table.numpy}:
+                table.numpy = numpy
+                self.assertEqual(list(files.group_indices("size")), [[1, 4], [0, 2]])
+                self.assertEqual(
+                    list(files.group_indices("size", min_count=1)),
+                    [[1, 4], [0, 2], [3]],
+                )
+                self.assertEqual(
+                    list(files.group_indices("size", "inode", rows=[0, 1, 2])), []
+                )
+                self.assertEqual(list(files.group_indices("size", rows=[])), [])
@@ -0,0 +1,105 @@
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from photomatools.model import MultimediaFile
+from photomatools.tools import Progress, preload
+from photomatools.utils import IOScheduler
+
+
+class TTY(StringIO):
+    def isatty(self):
+        return True
+
+
+class TestTools(unittest.TestCase):
+    def test_progress_rate(self):
+        clock = mock.Mock()
+        with mock.patch("photomatools.tools.time", clock), redirect_stdout(
+            TTY()
+        ) as out:
+            clock.monotonic.return_value = 0
+            progress = Progress(rate=10)
+            for now, name in ((0.05, "a"), (0.1, "b"), (0.15, "c")):
+                clock.monotonic.return_value = now
+                progress.update(name)
+        # the line is refreshed at most every 1/rate seconds
+        self.assertIn("2, 20.0 files/s, b", out.getvalue())
+        self.assertNotIn("files/s, a", out.getvalue())
+        self.assertNotIn("files/s, c", out.getvalue())
+
+    def test_progress_disabled(self):
+        for stdout, enabled in ((StringIO(), True), (TTY(), False)):
+            with redirect_stdout(stdout):
+                progress = Progress(rate=1e6, enabled=enabled)
+                progress.update("a")
+                progress.print("line")
+                # lines are printed directly without progress
+                self.assertEqual(stdout.getvalue(), "line\n")
+                progress.close()
+            self.assertEqual(stdout.getvalue(), "line\n")
+
+    def test_progress_close(self):
+        with redirect_stdout(TTY()) as out:
+            progress = Progress(rate=1e-6)
+            progress.print("first")
+            progress.update("a")
+            progress.print("second")
+            # lines are buffered until the next refresh
+            self.assertEqual(out.getvalue(), "")
+            progress.close()
+        self.assertIn("first\nsecond\n", out.getvalue())
+
+    def test_preload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            pulled = []
+
+            def files():
+                for i in range(95):
+                    (tmp / f"{i}.jpg").write_bytes(b"x" * i)
+                    pulled.append(i)
+                    yield MultimediaFile(tmp / f"{i}.jpg")
+
+            loaded = []
+            for item, size in preload(
+                files(),
+                lambda f: f.size,
+                workers=4,
+                verbose=False,
+                scheduler=IOScheduler("inode"),
+                batch_size=10,
+            ):
+                self.assertEqual(item.size, size)
+                loaded.append(size)
+                # files are not all listed before they are loaded
+                self.assertLessEqual(len(pulled) - len(loaded), 20)
+            self.assertEqual(sorted(loaded), list(range(95)))
+
+    def test_preload_whole_order(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            for i in range(30):
+                (tmp / f"{i}.jpg").write_bytes(b"x" * i)
+            files = [MultimediaFile(tmp / f"{i}.jpg") for i in range(30)]
+            for order, expected in (("walk", 20), ("inode", 30)):
+                pulled = []
+
+                def pull():
+                    for item in files:
+                        pulled.append(item)
+                        yield item
+
+                with mock.patch("photomatools.tools.PRELOAD_BATCH_SIZE", 10):
+                    for _ in preload(
+                        pull(),
+                        lambda f: f.size,
+                        verbose=False,
+                        scheduler=IOScheduler(order),
+                    ):
+                        break
+                # two batches are loaded in walk order, all files are sorted otherwise
+                self.assertEqual(len(pulled), expected)
@@ -0,0 +1,62 @@
+import hashlib
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+from photomatools.cli.uniq import Uniq
+
+from .conftest import parse_args
+
+
+class TestUniq(unittest.TestCase):
+    def is_named(self, name: str, *argv: str, folder: Path = Path(".")):
+        tool = Uniq()
+        return tool.is_named(folder / name, parse_args(tool, *argv))
+
+    def test_is_named(self):
+        data = b"foo"
+        for option, func in (
+            ("--md5", hashlib.md5),
+            ("--sha1", hashlib.sha1),
+            ("--sha256", hashlib.sha256),
+            ("--sha512", hashlib.sha512),
+        ):
+            name = func(data).hexdigest()
+            self.assertTrue(self.is_named(name, option))
+            # the length depends on the algorithm
+            self.assertFalse(self.is_named(name[:-1], option))
+            self.assertFalse(self.is_named(name + "0", option))
+        self.assertFalse(self.is_named("Z" * 32))
+        self.assertTrue(self.is_named("0123abcd", "--len", "8"))
+        self.assertFalse(self.is_named("0123abcd", "--sha1"))
+        # the extension is required with -e and not expected without
+        self.assertTrue(self.is_named("0123abcd.jpg", "-l", "8", "-e"))
+        self.assertFalse(self.is_named("0123abcd", "-l", "8", "-e"))
+        self.assertFalse(self.is_named("0123abcd.jpg", "-l", "8"))
+
+    def test_output(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            argv = ("-l", "8", "-o", str(tmp / "out"))
+            self.assertTrue(self.is_named("0123abcd", *argv, folder=tmp / "out"))
+            self.assertFalse(self.is_named("0123abcd", *argv, folder=tmp))
+
+    def test_verify(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            for data in (b"foo", b"bar", b"baz"):
+                (tmp / hashlib.md5(data).hexdigest()).write_bytes(data)
+            (tmp / "new.jpg").write_bytes(b"new")
+            # files already named are skipped, except the sample to verify
+            tool = Uniq()
+            out = StringIO()
+            with redirect_stdout(out):
+                tool.run(
+                    parse_args(tool, "-n", "--trust-names", "--verify", "2", str(tmp))
+                )
+            lines = out.getvalue().splitlines()
+            self.assertIn("Skip 1 file(s)", lines[0])
+            self.assertEqual(sum("already named" in line for line in lines[1:]), 2)
+            self.assertEqual(sum("Rename" in line for line in lines), 1)
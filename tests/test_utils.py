@@ -1,7 +1,22 @@
+import hashlib
+import os
+import tempfile
+import threading
 import unittest
 from datetime import datetime
+from pathlib import Path
+from unittest import mock
 
-from photomatools.utils import auto_datetime
+from photomatools.utils import (
+    IOScheduler,
+    TokenBucket,
+    TreeHash,
+    auto_datetime,
+    compute_fingerprint,
+    hash_file,
+    iter_to_groups_on_disk,
+    iter_to_map,
+)
 
 
 class TestUtils(unittest.TestCase):
@@ -22,4 +37,87 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(
             auto_datetime("2020:02:24 17:05:01.123"),
             datetime(2020, 2, 24, 17, 5, 1, 123000),
-        )
\ No newline at end of file
+        )
+
+    def test_groups_on_disk(self):
+        items = ["bb", "a", "ccc", "dd", "e", "", "ff"]
+        self.assertEqual(
+            list(iter_to_groups_on_disk(items, lambda x: len(x) or None)),
+            sorted(iter_to_map(items, lambda x: len(x) or None).items()),
+        )
+
+    def test_tree_hash(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+            TreeHash, "CHUNK_SIZE", 1000
+        ):
+            file = Path(tmp) / "file"
+            digests = set()
+            for size in (0, 999, 1000, 1001, 4567):
+                data = os.urandom(size)
+                file.write_bytes(data)
+                # same digest when hashed in parallel or sequentially
+                sequential = TreeHash()
+                for i in range(0, size, 333):
+                    sequential.update(data[i : i + 333])
+                self.assertEqual(
+                    compute_fingerprint(file, TreeHash), sequential.hexdigest()
+                )
+                digests.add(sequential.hexdigest())
+            self.assertEqual(len(digests), 5)
+
+    def test_io_scheduler(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            files = []
+            for name in ("c", "a", "b"):
+                files.append(Path(tmp) / name)
+                files[-1].write_bytes(name.encode())
+            missing = Path(tmp) / "missing"
+            inodes = sorted(files, key=lambda f: f.stat().st_ino)
+            self.assertEqual(
+                IOScheduler("inode").sort([missing, *files]), [*inodes, missing]
+            )
+            # the physical layout depends on the filesystem
+            self.assertEqual(
+                IOScheduler("physical").sort([missing, *files])[-1], missing
+            )
+            self.assertEqual(IOScheduler().sort(files), files)
+            scheduler = IOScheduler("inode", readers=1, readahead=2)
+            items = scheduler.sort(files)
+            task = scheduler.task(items, lambda f: f.read_bytes())
+            self.assertEqual(
+                list(map(task, range(len(items)))), [f.read_bytes() for f in items]
+            )
+            # a pool per device
+            device = os.stat(tmp).st_dev
+            scheduler = IOScheduler(device_workers={None: 1})
+            with scheduler.executor(4) as submit:
+                jobs = [
+                    submit(f, lambda: threading.current_thread().name) for f in files
+                ]
+                self.assertEqual({j.result() for j in jobs}, {f"io-{device}_0"})
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(100)
+        with mock.patch("time.sleep") as sleep:
+            # the burst is free, then consumers wait for the refill
+            bucket.consume(100)
+            sleep.assert_not_called()
+            bucket.consume(50)
+            self.assertAlmostEqual(sleep.call_args[0][0], 0.5, places=1)
+
+    def test_io_limit(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+            TreeHash, "READ_SIZE", 1000
+        ):
+            file = Path(tmp) / "file"
+            file.write_bytes(os.urandom(10000))
+            scheduler = IOScheduler(io_limit=1e9)
+            for func in (hashlib.md5, TreeHash):
+                with mock.patch.object(scheduler.bucket, "consume") as consume:
+                    task = scheduler.task([file], lambda f: hash_file(f, func))
+                    self.assertEqual(task(0), hash_file(file, func))
+                    # reads are throttled by chunks, not by file
+                    self.assertGreater(consume.call_count, 1)
+                    self.assertEqual(
+                        sum(c[0][0] for c in consume.call_args_list), 10000
+                    )
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from photomatools.cli.verify import Verify
+from photomatools.index import FingerprintIndex
+
+from .conftest import parse_args
+
+
+class TestVerify(unittest.TestCase):
+    def run_verify(self, *argv: str):
+        tool = Verify()
+        out = StringIO()
+        with redirect_stdout(out):
+            ret = tool.run(parse_args(tool, *argv))
+        return ret, out.getvalue().splitlines()
+
+    def test_index(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            library = tmp / "library"
+            library.mkdir()
+            for name in ("a", "b", "c", "d"):
+                (library / f"{name}.jpg").write_bytes(name.encode() * 10)
+            with FingerprintIndex(tmp / "index.db") as index:
+                index.scan([library])
+            # same size and mtime, the content changed silently
+            st = (library / "a.jpg").stat()
+            (library / "a.jpg").write_bytes(b"x" * 10)
+            os.utime(library / "a.jpg", ns=(st.st_atime_ns, st.st_mtime_ns))
+            (library / "b.jpg").unlink()
+            (library / "c.jpg").write_bytes(b"modified")
+
+            ret, lines = self.run_verify("--index", str(tmp / "index.db"))
+            self.assertEqual(ret, 1)
+            # results are printed when done
+            corrupted = next(line for line in lines if "Corrupted" in line)
+            self.assertIn("a.jpg", corrupted)
+            missing = f"Missing {library.resolve() / 'b.jpg'}"
+            self.assertTrue(any(missing in line for line in lines))
+            self.assertTrue(
+                lines[-1].endswith("1 ok, 1 corrupted, 1 missing, 1 changed, 0 error")
+            )
+            ret, lines = self.run_verify(
+                "--index", str(tmp / "index.db"), str(library / "d.jpg")
+            )
+            self.assertEqual(ret, 0)
+            self.assertTrue(lines[-1].startswith("Verify 1 file(s)"))
+
+    def test_other_algo(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            for data in (b"foo", b"bar"):
+                (tmp / hashlib.md5(data).hexdigest()).write_bytes(data)
+                (tmp / (hashlib.sha256(data).hexdigest() + ".jpg")).write_bytes(data)
+            # names given by uniq --sha256 are not md5 fingerprints
+            ret, lines = self.run_verify("--names", str(tmp))
+            self.assertEqual(ret, 0)
+            self.assertTrue(lines[-1].startswith("Verify 2 file(s)"))
+            self.assertTrue(
+                lines[-1].endswith("2 ok, 0 corrupted, 0 missing, 0 changed, 0 error")
+            )
+
+    def test_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            library = tmp / "library"
+            library.mkdir()
+            paths = []
+            for i in range(5):
+                data = str(i).encode()
+                name = hashlib.md5(data).hexdigest() + ".jpg"
+                (library / name).write_bytes(data)
+                paths.append(str(library.resolve() / name))
+            paths.sort()
+            checkpoint = tmp / "checkpoint"
+
+            def cursor():
+                return json.loads(checkpoint.read_text())["cursor"]
+
+            argv = ("--names", "--checkpoint", str(checkpoint), str(library))
+            with mock.patch("photomatools.cli.verify.BATCH_SIZE", 2):
+                # an interrupted run continues after the last verified file
+                checkpoint.write_text(json.dumps({"cursor": paths[1]}))
+                ret, lines = self.run_verify(*argv)
+                self.assertEqual(ret, 0)
+                self.assertTrue(lines[-1].startswith("Verify 3 file(s)"))
+                self.assertIsNone(cursor())
+                # fractions rotate through the files and wrap around
+                cursors = []
+                for _ in range(3):
+                    ret, lines = self.run_verify("--fraction", "0.4", *argv)
+                    self.assertTrue(lines[-1].startswith("Verify 2 file(s)"))
+                    cursors.append(cursor())
+                self.assertEqual(cursors, [paths[1], paths[3], paths[0]])